@@ -1,31 +1,46 @@
 import asyncio
+import io
 import logging
 import os
 import signal
+import time
 from pathlib import Path
 from typing import Optional, TYPE_CHECKING
 
 import discord
-from asyncpg import create_pool
+from asyncpg import Pool, create_pool
 from discord.ext import commands
 from dotenv import load_dotenv
 
 from bot import constants, errors
 from bot.database import Database
-from bot.model.cache import Cache
+from bot.model.alerts import Alert, AlertDigest
+from bot.model.jobs import JobQueue
+from bot.model.locks import LockManager
+from bot.model.snapshot import dump_snapshot, load_snapshot
 from bot.model.team import TeamGuild
+from bot.model.throttle import Throttle
 from bot.tree import PhoenixTree
+from bot.utils import get_or_fetch_channel, resident_memory
 
 _log = logging.getLogger(__name__)
 
 load_dotenv()
 
 if TYPE_CHECKING:
-    from bot.utils.types import Context
+    from bot.model.snapshot import Entries as SnapshotEntries
+    from bot.utils.types import Context, Interaction, TeamSummaryData
 
 
 class Phoenix(commands.Bot):
-    """The client class used to control the bot."""
+    """The client class used to control the bot.
+
+    In the lean gateway mode, see `constants.Gateway`, members are only cached
+    for guilds that have teams and once they join a guild. Guilds with teams
+    are chunked in the background after startup, and `ensure_chunked` chunks a
+    guild on demand, such as when its first team is created or before bulk
+    operations that need its full member list.
+    """
 
     def __init__(self) -> None:
         mentions = discord.AllowedMentions.none()
@@ -36,25 +51,66 @@ class Phoenix(commands.Bot):
         intents.members = True
         intents.message_content = True
 
+        self.lean = constants.Gateway.member_cache == "lean"
+        if self.lean:
+            # Role changes are only dispatched for cached members, joined
+            # members are cached so the roles of new players are mirrored
+            member_cache_flags = discord.MemberCacheFlags.none()
+            member_cache_flags.joined = True
+        else:
+            member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
         super().__init__(
             command_prefix=constants.Client.prefix,
             tree_cls=PhoenixTree,
             intents=intents,
             allowed_mentions=mentions,
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=not self.lean,
         )
 
         self.add_listener(self.__awake_hook, "on_ready")
-        self.__database: Optional[Database] = None
-        self.__team_guild_cache: Cache[int, TeamGuild] = Cache()
+        self.__database = Database()
+        self.__database_ready = asyncio.Event()
+        self.team_locks = LockManager("team")
+        self.throttle = Throttle(
+            guild=constants.Throttle.guild, user=constants.Throttle.user
+        )
+        self.__jobs = JobQueue(
+            self.__database,
+            workers=constants.Jobs.workers,
+            poll_interval=constants.Jobs.poll_interval,
+        )
+        # Every guild the bot is in, removed by `forget_team_guild`
+        self.__team_guilds: dict[int, TeamGuild] = {}
+        self.__snapshot: dict[int, "SnapshotEntries"] = {}
+        self.__warmed = False
+        self.__chunking: set[asyncio.Task[bool]] = set()
+        self.__started = time.perf_counter()
+        self.__alerts = AlertDigest(
+            self.__send_alerts,
+            interval=constants.Alerts.digest_interval,
+            limit=constants.Alerts.digest_limit,
+        )
 
     @property
     def database(self) -> Database:
-        """The database to query."""
-        if self.__database is None:
-            raise Exception("The database connection is not established")
+        """The database to query.
 
+        Queries raise `errors.DatabaseUnavailableError` until the pool has
+        connected.
+        """
         return self.__database
 
+    @property
+    def jobs(self) -> JobQueue:
+        """The queue of background jobs.
+
+        Workers start once the database has connected, jobs queued before
+        that are run then.
+        """
+        return self.__jobs
+
     @property
     def tree(self) -> PhoenixTree:
         """The command tree linked with the custom client."""
@@ -67,17 +123,161 @@ class Phoenix(commands.Bot):
 
         _log.info("Awake as @%s#%s", user.name, user.discriminator)
 
+        if not self.__warmed:
+            self.__warmed = True
+
+            _log.info(
+                "Ready in %.1fs | %s",
+                time.perf_counter() - self.__started,
+                self.gateway_report(),
+            )
+
+            try:
+                await self.warm_team_guilds()
+            except Exception:
+                _log.exception("team cache warm-up failed")
+
+            if self.lean:
+                await self.__chunk_team_guilds()
+
+    async def __chunk_team_guilds(self) -> None:
+        """Chunk the guilds that have teams, one after another."""
+        start = time.perf_counter()
+        chunked = 0
+
+        for guild in self.guilds:
+            team_guild = self.get_cached_team_guild(guild.id)
+            if team_guild is None or not team_guild.cached_teams():
+                continue
+
+            try:
+                chunked += await self.ensure_chunked(guild)
+            except Exception:
+                _log.exception("chunking guild %d failed", guild.id)
+
+        _log.info(
+            "Chunked %d team guilds in %.1fs | %s",
+            chunked,
+            time.perf_counter() - start,
+            self.gateway_report(),
+        )
+
+    async def ensure_chunked(self, guild: discord.Guild) -> bool:
+        """Ensure every member of the guild is cached.
+
+        Returns True if the guild had to be chunked. Concurrent calls for a
+        guild share a single chunk request.
+        """
+        if guild.chunked:
+            return False
+
+        start = time.perf_counter()
+        await guild.chunk()
+        _log.debug(
+            "chunked %d members of guild %d in %.2fs",
+            len(guild.members),
+            guild.id,
+            time.perf_counter() - start,
+        )
+
+        return True
+
+    def chunk_in_background(self, guild: discord.Guild) -> None:
+        """Start `ensure_chunked` for the guild without waiting on it."""
+        if guild.chunked:
+            return
+
+        def done(task: "asyncio.Task[bool]") -> None:
+            self.__chunking.discard(task)
+            if not task.cancelled() and (error := task.exception()):
+                _log.warning(
+                    "chunking guild %d failed", guild.id, exc_info=error
+                )
+
+        task = asyncio.create_task(self.ensure_chunked(guild))
+        task.add_done_callback(done)
+        self.__chunking.add(task)
+
+    def gateway_report(self) -> str:
+        """Describe the member cache and the memory use of the process."""
+        guilds = self.guilds
+        chunked = sum(guild.chunked for guild in guilds)
+        members = sum(len(guild.members) for guild in guilds)
+
+        return (
+            f"{constants.Gateway.member_cache} member cache, "
+            f"{chunked}/{len(guilds)} guilds chunked, "
+            f"{members} members cached, "
+            f"{resident_memory() / 2**20:.1f} MiB resident"
+        )
+
+    async def warm_team_guilds(self) -> None:
+        """Prefill the team guild caches for every guild the bot is in.
+
+        The teams and member counts of all guilds are loaded with a single
+        query so the first commands after a restart do not hit a cold cache.
+        """
+        await self.__database_ready.wait()
+
+        start = time.perf_counter()
+        guilds = {guild.id: guild for guild in self.guilds}
+
+        entries = await self.database.fetch_team_summaries(list(guilds))
+
+        grouped: dict[int, list[TeamSummaryData]] = {id: [] for id in guilds}
+        for data in entries:
+            grouped[data["guild_id"]].append(data)
+
+        for guild_id, teams in grouped.items():
+            team_guild = self.get_team_guild(guilds[guild_id])
+            team_guild._populate((data, data["member_count"]) for data in teams)
+
+            # Teams from a snapshot or created meanwhile may be missing
+            fetched = {data["id"] for data in teams}
+            try:
+                await team_guild._forget_missing(
+                    team.id
+                    for team in team_guild.cached_teams()
+                    if team.id not in fetched
+                )
+            except errors.DatabaseUnavailableError:
+                team_guild.invalidate()
+
+        _log.info(
+            "Warmed %d teams in %d guilds in %.3fs",
+            len(entries),
+            len(guilds),
+            time.perf_counter() - start,
+        )
+
     async def setup_hook(self) -> None:
         """Set up the client's extensions and graceful shutdown handler."""
         self.remove_command("help")
+        self.__snapshot = load_snapshot(
+            Path(constants.Cache.snapshot_path),
+            constants.Cache.snapshot_max_age,
+        )
         await self.__load_extensions(Path("bot/ext"))
-        await self.ensure_database()
+
+        # Cached and snapshot data is served while the pool is connecting
+        asyncio.create_task(self.__connect_database())
 
         async def shutdown() -> None:
             _log.info("client is closing")
 
-            if self.__database is not None:
-                await self.__database.close()
+            self.save_snapshot()
+            await self.__alerts.flush()
+            await self.__jobs.stop()
+
+            # Gears write their pending changes when unloaded, which needs
+            # the database, `close` would only unload them afterwards
+            for extension in tuple(self.extensions):
+                try:
+                    await self.unload_extension(extension)
+                except Exception:
+                    _log.exception("unloading %s failed", extension)
+
+            await self.__database.close()
             await self.close()
 
         def signal_handler() -> None:
@@ -113,13 +313,31 @@ class Phoenix(commands.Bot):
             _log.exception("an error occurred while loading extension")
             return False
 
+    async def __connect_database(self) -> None:
+        """Connect to the database, retrying until it is available."""
+        delay = 1.0
+        while True:
+            try:
+                await self.ensure_database()
+                await self.__jobs.start()
+                return
+            except Exception:
+                _log.warning(
+                    "Database connection failed: retrying in %.0fs",
+                    delay,
+                    exc_info=True,
+                )
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
     async def ensure_database(self) -> Database:
         """Ensure the database is available through the pool connection.
 
         Uses env variables to connect to the postgres database through asyncpg.
         This bot requires the use of postgres and will not function without it.
         """
-        if self.__database is not None and not self.__database.closed:
+        if not self.__database.closed:
             return self.database
 
         _log.warn("Database connection: initializing")
@@ -134,22 +352,71 @@ class Phoenix(commands.Bot):
         if pool is None:
             raise Exception("Database failed to connect: pool not returned")
 
-        self.__database = Database(pool)
+        self.__database.attach(pool, await self.__create_replica_pool())
+        self.__database_ready.set()
         _log.warn("Database connection: initialized")
 
         return self.database
 
+    async def __create_replica_pool(self) -> Optional[Pool]:
+        """Create the pool of the read replica if one is configured.
+
+        The replica is optional, if it can not be reached reads are served by
+        the primary.
+        """
+        if (host := os.getenv("POSTGRES_REPLICA_HOST")) is None:
+            return None
+
+        try:
+            return await create_pool(
+                user=os.getenv("POSTGRES_USER"),
+                password=os.getenv("POSTGRES_PASSWORD"),
+                host=host,
+                port=5432,
+                database=os.getenv("POSTGRES_DB"),
+            )
+        except Exception:
+            _log.exception("Database replica connection failed: using primary")
+            return None
+
     def get_team_guild(self, guild: discord.Guild) -> TeamGuild:
         """Return a `TeamGuild` for the provided guild."""
-        team_guild = self.__team_guild_cache.get(guild.id)
+        team_guild = self.__team_guilds.get(guild.id)
         if team_guild:
             return team_guild
 
         team_guild = TeamGuild(self.database, guild=guild)
-        self.__team_guild_cache.put(guild.id, team_guild)
+        self.__team_guilds[guild.id] = team_guild
+
+        if (entries := self.__snapshot.pop(guild.id, None)) is not None:
+            team_guild._populate(entries, fresh=False)
 
         return team_guild
 
+    def save_snapshot(self) -> None:
+        """Write the cached teams of every guild to the on-disk snapshot."""
+        guilds = {}
+        for guild_id, team_guild in self.__team_guilds.items():
+            if (entries := team_guild._export()) is not None:
+                guilds[guild_id] = entries
+
+        try:
+            dump_snapshot(Path(constants.Cache.snapshot_path), guilds)
+        except OSError:
+            _log.exception("team cache snapshot could not be written")
+            return
+
+        _log.info("team cache snapshot written for %d guilds", len(guilds))
+
+    def get_cached_team_guild(self, guild_id: int) -> Optional[TeamGuild]:
+        """Return the `TeamGuild` for the guild id only if it is cached."""
+        return self.__team_guilds.get(guild_id)
+
+    def forget_team_guild(self, guild_id: int) -> None:
+        """Drop the cached `TeamGuild` and any snapshot data of the guild."""
+        self.__team_guilds.pop(guild_id, None)
+        self.__snapshot.pop(guild_id, None)
+
     async def on_command_error(  # type: ignore[override]
         self, context: "Context", error: commands.CommandError
     ) -> None:
@@ -161,6 +428,13 @@ class Phoenix(commands.Bot):
         if isinstance(error, commands.CommandNotFound):
             return None
 
+        original = getattr(error, "original", None)
+        if isinstance(original, errors.DatabaseUnavailableError):
+            embed = original.format_notif_embed(context)
+            await context.send(embed=embed)
+
+            return None
+
         if isinstance(error, commands.CommandInvokeError):
             embed = errors.InternalError().format_notif_embed(context)
             await context.send(embed=embed)
@@ -189,6 +463,58 @@ class Phoenix(commands.Bot):
         return await super().on_command_error(context, error)
 
     async def alert(
-        self, interaction: "Context", error: commands.CommandError
+        self, info: "Context | Interaction", error: BaseException
     ) -> None:
-        """TODO."""
+        """Report an unhandled error to the devs.
+
+        Errors are logged immediately and posted to the alert channel as part
+        of a periodic digest, repeats of an error are counted rather than
+        posted again.
+        """
+        source = "unknown"
+        if isinstance(info, commands.Context):
+            if info.command is not None:
+                source = info.command.qualified_name
+        elif info.command is not None:
+            source = info.command.qualified_name
+
+        _log.error("unhandled error in %s", source, exc_info=error)
+        self.__alerts.report(error, source=source)
+
+    async def __send_alerts(self, alerts: list[Alert], dropped: int) -> None:
+        """Post a digest of alerts to the alert channel."""
+        total = sum(alert.count for alert in alerts)
+        header = f"**{total} errors of {len(alerts)} kinds**"
+        if dropped:
+            header += f" and {dropped} errors of further kinds"
+
+        lines = [header]
+        for alert in alerts:
+            lines.append(
+                f"`{alert.fingerprint}` x{alert.count} "
+                f"<t:{alert.first:.0f}:T>-<t:{alert.last:.0f}:T> "
+                f"in {', '.join(sorted(alert.sources))}: {alert.title}"
+            )
+
+        channel_id = constants.Channels.alerts
+        if channel_id is None:
+            _log.warning("alert digest\n%s", "\n".join(lines))
+            return
+
+        details = "\n\n".join(
+            f"{alert.fingerprint} x{alert.count}\n{alert.traceback}"
+            for alert in alerts
+        )
+        channel = await get_or_fetch_channel(self, channel_id)
+        if not isinstance(channel, discord.abc.Messageable):
+            raise errors.InitializationError(
+                content="alert channel %d can not be messaged" % channel_id
+            )
+
+        await channel.send(
+            "\n".join(lines)[:2000],
+            file=discord.File(
+                io.BytesIO(details.encode()), filename="tracebacks.txt"
+            ),
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
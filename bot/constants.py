@@ -1,3 +1,6 @@
+from typing import ClassVar
+
+
 class _Client:
     prefix: str = "!"
 
@@ -5,13 +8,47 @@ class _Client:
 Client = _Client
 
 
+class _Interactions:
+    # Seconds after creation an unanswered command is deferred automatically,
+    # discord fails interactions that are not answered within 3 seconds
+    auto_defer_after: float = 2.5
+
+
+Interactions = _Interactions()
+
+
 class _Channels:
     schedule_requests = 1152411129465819207
 
+    # Digests of internal errors are posted here, they are only logged if unset
+    alerts: int | None = None
+
 
 Channels = _Channels()
 
 
+class _Alerts:
+    # Seconds errors are collected before a digest is sent, and the most kinds
+    # of errors a single digest describes
+    digest_interval: float = 60
+    digest_limit: int = 25
+
+
+Alerts = _Alerts()
+
+
+class _Jobs:
+    # Workers running jobs of any priority, one more only runs interactive jobs
+    workers: int = 2
+    # Seconds idle workers wait before checking the queue again
+    poll_interval: float = 30
+    # Items processed by a bulk job between checkpoints
+    checkpoint_every: int = 25
+
+
+Jobs = _Jobs()
+
+
 class _Roles:
     executive: int = 484489190801801218
     lead: int = 962876790278348810
@@ -25,3 +62,64 @@ class _Guild:
 
 
 Guild = _Guild()
+
+
+class _Gateway:
+    # "full" caches every member and chunks every guild at startup. "lean" only
+    # caches members that join and the members of guilds that have teams,
+    # which are chunked after startup
+    member_cache: str = "lean"
+
+
+Gateway = _Gateway()
+
+
+class _Sync:
+    # Seconds role changes seen on discord are coalesced before being written
+    role_mirror_interval: float = 2
+
+
+Sync = _Sync()
+
+
+class _Throttle:
+    # Cost classes of commands mapped to the tokens refilled per second and the
+    # burst allowed, per guild and per user. Classes not listed are unlimited
+    guild: ClassVar[dict[str, tuple[float, int]]] = {
+        "autocomplete": (10, 30),
+        "list": (1, 10),
+        "bulk": (1 / 60, 3),
+    }
+    user: ClassVar[dict[str, tuple[float, int]]] = {
+        "autocomplete": (3, 10),
+        "list": (0.5, 5),
+        "bulk": (1 / 120, 2),
+    }
+
+
+Throttle = _Throttle()
+
+
+class _Cache:
+    snapshot_path: str = ".records/teams.snapshot.gz"
+    snapshot_max_age: float = 60 * 60 * 24 * 7
+
+    # Seconds cached teams are served without a background refresh
+    team_freshness: float = 60
+    team_freshness_overrides: ClassVar[dict[int, float]] = {}
+
+
+Cache = _Cache()
+
+
+class _Database:
+    # Seconds before a query is abandoned and counted as a failure
+    query_timeout: float = 5
+    bulk_timeout: float = 120
+
+    # Consecutive failures before queries fail fast, and the recovery probe
+    breaker_threshold: int = 5
+    probe_interval: float = 5
+
+
+Database = _Database()
@@ -1,27 +1,152 @@
+import json
 import logging
-from typing import Optional, cast
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, IO, Optional, cast
 
 import asyncpg
 
-from bot.utils.types import TeamData
+from bot import constants, errors
+from bot.model.breaker import CircuitBreaker, CircuitOpenError
+from bot.utils.types import JobData, TeamData, TeamSummaryData
 
 _log = logging.getLogger(__name__)
 
+# Exceptions indicating the database itself is unreachable or unhealthy
+_FAILURES = (
+    OSError,
+    asyncpg.InterfaceError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.OperatorInterventionError,
+)
+
+
+# Set once a task has written through the primary, see `Database`
+_pinned: ContextVar[bool] = ContextVar("pinned", default=False)
+
+
+def _affected(status: str) -> int:
+    """Return the number of rows affected from a command status string."""
+    _, _, count = status.rpartition(" ")
+    return int(count) if count.isdigit() else 0
+
+
+def _job(record: asyncpg.Record) -> JobData:
+    """Build the job data of a record, decoding its json columns."""
+    data = dict(record)
+    data["payload"] = json.loads(data["payload"])
+    if data["checkpoint"] is not None:
+        data["checkpoint"] = json.loads(data["checkpoint"])
+
+    return cast(JobData, data)
+
 
 class Database:
-    """A pooled database connection with predefined queries."""
+    """A pooled database connection with predefined queries.
 
-    def __init__(self, pool: asyncpg.Pool) -> None:
-        self.__pool = pool
+    An optional replica pool serves read queries. Once a task has written
+    through the primary it is pinned to the primary for the rest of its
+    lifetime, so a request always reads its own writes. `pin_primary` pins a
+    task explicitly.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[asyncpg.Pool] = None,
+        replica: Optional[asyncpg.Pool] = None,
+    ) -> None:
+        self.__primary = pool
+        self.__replica = replica
+        self.__breaker = CircuitBreaker(
+            "database",
+            lambda: self.__probe(self.__primary),
+            failures=_FAILURES,
+            threshold=constants.Database.breaker_threshold,
+            interval=constants.Database.probe_interval,
+        )
+        self.__replica_breaker = CircuitBreaker(
+            "database replica",
+            lambda: self.__probe(self.__replica),
+            failures=_FAILURES,
+            threshold=constants.Database.breaker_threshold,
+            interval=constants.Database.probe_interval,
+        )
 
     @property
     def closed(self) -> bool:
-        """A bool indicating if the pool connection is closed."""
-        return self.__pool._closed  # type: ignore [no-any-return]
+        """A bool indicating if the pool connection is closed or missing."""
+        pool = self.__primary
+        return pool is None or pool._closed
+
+    def attach(
+        self, pool: asyncpg.Pool, replica: Optional[asyncpg.Pool] = None
+    ) -> None:
+        """Attach the pools used to run queries once they are connected."""
+        self.__primary = pool
+        self.__replica = replica
 
     async def close(self) -> None:
-        """Close the pool connection."""
-        await self.__pool.close()
+        """Close the pool connections."""
+        for pool in (self.__primary, self.__replica):
+            if pool is not None:
+                await pool.close()
+
+    def pin_primary(self) -> None:
+        """Route the reads of the current task to the primary."""
+        _pinned.set(True)
+
+    @asynccontextmanager
+    async def __guard(
+        self, *, read: bool = False, bulk: bool = False, primary: bool = False
+    ) -> AsyncIterator[asyncpg.Pool]:
+        """Provide a pool to run the enclosed query on.
+
+        Reads use the replica when one is available, the task is not pinned
+        and the replica is healthy. Writes use the primary and pin the task.
+        Reads with `primary` use the primary without pinning the task.
+
+        The query runs under the pool's circuit breaker with a timeout.
+        Connection failures, timeouts, an open circuit and a missing pool are
+        raised as `DatabaseUnavailableError`, which read paths use to fall
+        back to cached data. Bulk operations get a longer timeout.
+        """
+        pool, breaker = self.__primary, self.__breaker
+        if not read:
+            self.pin_primary()
+        elif (
+            not primary
+            and self.__replica is not None
+            and not _pinned.get()
+            and not self.__replica_breaker.open
+        ):
+            pool, breaker = self.__replica, self.__replica_breaker
+
+        if pool is None:
+            raise errors.DatabaseUnavailableError
+
+        timeout = (
+            constants.Database.bulk_timeout
+            if bulk
+            else constants.Database.query_timeout
+        )
+
+        try:
+            async with breaker.guard(timeout):
+                yield pool
+        except CircuitOpenError as e:
+            raise errors.DatabaseUnavailableError from e
+        except (TimeoutError, *_FAILURES) as e:
+            _log.warning("%s query failed: %r", breaker.name, e)
+            raise errors.DatabaseUnavailableError from e
+
+    async def __probe(self, pool: Optional[asyncpg.Pool]) -> None:
+        """Run a trivial query to check if the database responds."""
+        if pool is None:
+            raise errors.DatabaseUnavailableError
+
+        await pool.fetchval("SELECT 1")
 
     async def fetch_members_from_team(self, id: int) -> list[int]:
         """Select a list of member ids within a team."""
@@ -32,16 +157,16 @@ class Database:
             WHERE team_id = $1
         """
 
-        conn = self.__pool
-        members = await conn.fetch(
-            query,
-            id,
-        )
+        async with self.__guard(read=True) as conn:
+            members = await conn.fetch(
+                query,
+                id,
+            )
 
         return [m["user_id"] for m in members]
 
-    async def add_member_to_team(self, team_id: int, user_id: int) -> None:
-        """Insert a user id into a team."""
+    async def add_member_to_team(self, team_id: int, user_id: int) -> bool:
+        """Insert a user id into a team and return if a row was inserted."""
         _log.debug("add %d to %d", user_id, team_id)
         query = """
             INSERT INTO team_member (team_id, user_id)
@@ -49,23 +174,113 @@ class Database:
             ON CONFLICT DO NOTHING;
         """
 
-        conn = self.__pool
-        await conn.execute(query, team_id, user_id)
+        async with self.__guard() as conn:
+            status = await conn.execute(query, team_id, user_id)
+
+        return _affected(status) > 0
+
+    async def import_members(
+        self, records: Sequence[tuple[int, int]]
+    ) -> set[tuple[int, int]]:
+        """Insert many (team id, user id) pairs and return the inserted ones.
+
+        The records are staged with `COPY` into a temporary table and merged
+        into `team_member` with a single statement in one transaction. Pairs
+        that already exist are skipped.
+        """
+        _log.debug("import %d team members", len(records))
+
+        async with (
+            self.__guard(bulk=True) as pool,
+            pool.acquire() as conn,
+            conn.transaction(),
+        ):
+            await conn.execute(
+                """
+                CREATE TEMPORARY TABLE team_member_import (
+                    team_id INTEGER NOT NULL,
+                    user_id BIGINT NOT NULL
+                ) ON COMMIT DROP;
+                """
+            )
+            await conn.copy_records_to_table(
+                "team_member_import", records=records
+            )
+
+            inserted = await conn.fetch(
+                """
+                INSERT INTO team_member (team_id, user_id)
+                SELECT DISTINCT i.team_id, i.user_id
+                FROM team_member_import i
+                JOIN team t ON t.id = i.team_id
+                ON CONFLICT DO NOTHING
+                RETURNING team_id, user_id;
+                """
+            )
+
+        return {(r["team_id"], r["user_id"]) for r in inserted}
+
+    async def apply_memberships(
+        self,
+        added: Sequence[tuple[int, int]],
+        removed: Sequence[tuple[int, int]],
+    ) -> tuple[set[tuple[int, int]], set[tuple[int, int]]]:
+        """Add and remove many (team id, user id) pairs in one transaction.
+
+        Returns the pairs that were inserted and deleted, pairs that were
+        already in the requested state are skipped.
+        """
+        _log.debug("apply %d added, %d removed", len(added), len(removed))
+
+        async with (
+            self.__guard(bulk=True) as pool,
+            pool.acquire() as conn,
+            conn.transaction(),
+        ):
+            inserted = await conn.fetch(
+                """
+                INSERT INTO team_member (team_id, user_id)
+                SELECT DISTINCT a.team_id, a.user_id
+                FROM unnest($1::int[], $2::bigint[]) AS a(team_id, user_id)
+                JOIN team t ON t.id = a.team_id
+                ON CONFLICT DO NOTHING
+                RETURNING team_id, user_id;
+                """,
+                [team_id for team_id, _ in added],
+                [user_id for _, user_id in added],
+            )
+            deleted = await conn.fetch(
+                """
+                DELETE FROM team_member m
+                USING unnest($1::int[], $2::bigint[]) AS r(team_id, user_id)
+                WHERE m.team_id = r.team_id AND m.user_id = r.user_id
+                RETURNING m.team_id, m.user_id;
+                """,
+                [team_id for team_id, _ in removed],
+                [user_id for _, user_id in removed],
+            )
+
+        return (
+            {(r["team_id"], r["user_id"]) for r in inserted},
+            {(r["team_id"], r["user_id"]) for r in deleted},
+        )
 
-    async def remove_member_from_team(self, team_id: int, user_id: int) -> None:
-        """Remove a user id from a team."""
+    async def remove_member_from_team(self, team_id: int, user_id: int) -> bool:
+        """Remove a user id from a team and return if a row was deleted."""
         _log.debug("remove %d from %d", user_id, team_id)
         query = """
             DELETE FROM team_member
             WHERE team_id = $1 AND user_id = $2;
         """
 
-        conn = self.__pool
-        await conn.execute(
-            query,
-            team_id,
-            user_id,
-        )
+        async with self.__guard() as conn:
+            status = await conn.execute(
+                query,
+                team_id,
+                user_id,
+            )
+
+        return _affected(status) > 0
 
     async def update_team(
         self,
@@ -74,29 +289,39 @@ class Database:
         lead_role_id: Optional[int] = None,
         member_role_id: Optional[int] = None,
         name: Optional[str] = None,
+        *,
+        expected_version: Optional[int] = None,
     ) -> TeamData:
         """Update a team's values.
 
         Makes used of coalesce which returns the first non-null value. This
         should allow the passing of default values without the need to overwrite
+
+        If `expected_version` is provided the update only applies if the row is
+        still at that version, `errors.EditConflictError` is raised otherwise.
+        The version itself is increased by a trigger on every update.
         """
         query = """
             UPDATE team SET
                 name = COALESCE($1, name),
                 lead_role_id = COALESCE($2, lead_role_id),
                 member_role_id = COALESCE($3, member_role_id)
-            WHERE id = $4
+            WHERE id = $4 AND ($5::bigint IS NULL OR version = $5)
             RETURNING *
         """
 
-        conn = self.__pool
-        data = await conn.fetchrow(
-            query,
-            name,
-            lead_role_id,
-            member_role_id,
-            id,
-        )
+        async with self.__guard() as conn:
+            data = await conn.fetchrow(
+                query,
+                name,
+                lead_role_id,
+                member_role_id,
+                id,
+                expected_version,
+            )
+
+        if data is None:
+            raise errors.EditConflictError
 
         return cast(TeamData, data)
 
@@ -108,8 +333,8 @@ class Database:
             WHERE id = $1
         """
 
-        conn = self.__pool
-        await conn.execute(query, id)
+        async with self.__guard() as conn:
+            await conn.execute(query, id)
 
     async def create_team(
         self, guild_id: int, name: str, lead_role_id: int, member_role_id: int
@@ -121,14 +346,14 @@ class Database:
             RETURNING *;
         """
 
-        conn = self.__pool
-        data = await conn.fetchrow(
-            query,
-            name,
-            guild_id,
-            lead_role_id,
-            member_role_id,
-        )
+        async with self.__guard() as conn:
+            data = await conn.fetchrow(
+                query,
+                name,
+                guild_id,
+                lead_role_id,
+                member_role_id,
+            )
 
         return cast(TeamData, data)
 
@@ -140,13 +365,13 @@ class Database:
             WHERE id = $1
         """
 
-        conn = self.__pool
-        data = await conn.fetch(
-            query,
-            id,
-        )
+        async with self.__guard(read=True) as conn:
+            data = await conn.fetchrow(
+                query,
+                id,
+            )
 
-        return cast(TeamData, data)
+        return cast(Optional[TeamData], data)
 
     async def fetch_teams_from_guild(self, guild_id: int) -> list[TeamData]:
         """Return a list of teams related to a guild."""
@@ -156,10 +381,292 @@ class Database:
             WHERE guild_id = $1
         """
 
-        conn = self.__pool
-        entries = await conn.fetch(
-            query,
-            guild_id,
-        )
+        async with self.__guard(read=True) as conn:
+            entries = await conn.fetch(
+                query,
+                guild_id,
+            )
+
+        return [cast(TeamData, data) for data in entries]
+
+    async def fetch_team_versions(self, guild_id: int) -> dict[int, int]:
+        """Return the version of every team in a guild by team id.
+
+        Used to revalidate cached teams without transferring whole rows.
+        """
+        query = """
+            SELECT id, version
+            FROM team
+            WHERE guild_id = $1
+        """
+
+        async with self.__guard(read=True) as conn:
+            entries = await conn.fetch(
+                query,
+                guild_id,
+            )
+
+        return {entry["id"]: entry["version"] for entry in entries}
+
+    async def fetch_existing_team_ids(self, ids: Sequence[int]) -> set[int]:
+        """Return the provided team ids that still exist.
+
+        Always reads from the primary, as the replica may not have seen teams
+        that were just created.
+        """
+        query = """
+            SELECT id
+            FROM team
+            WHERE id = ANY($1::int[])
+        """
+
+        async with self.__guard(read=True, primary=True) as conn:
+            entries = await conn.fetch(query, list(ids))
+
+        return {entry["id"] for entry in entries}
+
+    async def fetch_teams(self, ids: Sequence[int]) -> list[TeamData]:
+        """Return the teams with the provided ids."""
+        query = """
+            SELECT *
+            FROM team
+            WHERE id = ANY($1::int[])
+        """
+
+        async with self.__guard(read=True) as conn:
+            entries = await conn.fetch(
+                query,
+                list(ids),
+            )
 
         return [cast(TeamData, data) for data in entries]
+
+    async def fetch_team_summaries(
+        self, guild_ids: Sequence[int]
+    ) -> list[TeamSummaryData]:
+        """Return the teams and their member counts for many guilds at once."""
+        query = """
+            SELECT t.*, COUNT(m.user_id)::int AS member_count
+            FROM team t
+            LEFT JOIN team_member m ON m.team_id = t.id
+            WHERE t.guild_id = ANY($1::bigint[])
+            GROUP BY t.id
+        """
+
+        async with self.__guard(read=True) as conn:
+            entries = await conn.fetch(
+                query,
+                list(guild_ids),
+            )
+
+        return [cast(TeamSummaryData, data) for data in entries]
+
+    async def copy_roster(
+        self,
+        guild_id: int,
+        output: IO[bytes],
+        /,
+        team_ids: Optional[Sequence[int]] = None,
+    ) -> None:
+        """Stream the roster of a guild as csv into the output.
+
+        Uses `COPY ... TO STDOUT` so rows are written to the output as they
+        are produced rather than collected in memory. If team ids are provided,
+        only the rosters of those teams are copied.
+        """
+        # COPY inlines its arguments, where a NULL array is not valid syntax,
+        # so the team filter is only added when there are ids to filter by
+        args: list[Any] = [guild_id]
+        team_filter = ""
+        if team_ids is not None:
+            args.append(list(team_ids))
+            team_filter = "AND t.id = ANY($2::int[])"
+
+        query = f"""
+            SELECT
+                t.id AS team_id,
+                t.name AS team_name,
+                t.lead_role_id,
+                t.member_role_id,
+                m.user_id
+            FROM team t
+            LEFT JOIN team_member m ON m.team_id = t.id
+            WHERE t.guild_id = $1 {team_filter}
+            ORDER BY t.name, m.user_id
+        """
+
+        async with self.__guard(read=True, bulk=True) as conn:
+            await conn.copy_from_query(
+                query, *args, output=output, format="csv", header=True
+            )
+
+    async def create_job(
+        self,
+        kind: str,
+        guild_id: int,
+        payload: dict[str, Any],
+        *,
+        priority: int,
+        created_by: Optional[int] = None,
+    ) -> JobData:
+        """Queue a job and return its data.
+
+        If an identical job is already queued or running no job is created and
+        the existing job is returned instead.
+        """
+        query = """
+            WITH created AS (
+                INSERT INTO job (kind, guild_id, payload, priority, created_by)
+                VALUES ($1, $2, $3::jsonb, $4, $5)
+                ON CONFLICT (kind, guild_id, payload)
+                    WHERE status IN ('queued', 'running')
+                    DO NOTHING
+                RETURNING *
+            )
+            SELECT * FROM created
+            UNION ALL
+            SELECT *
+            FROM job
+            WHERE kind = $1 AND guild_id = $2 AND payload = $3::jsonb
+                AND status IN ('queued', 'running')
+                AND NOT EXISTS (SELECT 1 FROM created)
+            LIMIT 1
+        """
+
+        data = None
+        # The existing job may finish between the conflict and the select
+        for _ in range(2):
+            async with self.__guard() as conn:
+                data = await conn.fetchrow(
+                    query,
+                    kind,
+                    guild_id,
+                    json.dumps(payload),
+                    priority,
+                    created_by,
+                )
+
+            if data is not None:
+                break
+
+        if data is None:
+            raise errors.DatabaseUnavailableError
+
+        return _job(data)
+
+    async def claim_job(self, min_priority: int) -> Optional[JobData]:
+        """Mark the next queued job as running and return it.
+
+        Jobs are claimed by priority and then in the order they were queued.
+        Jobs below `min_priority` are not claimed.
+        """
+        query = """
+            UPDATE job SET status = 'running', updated_at = now()
+            WHERE id = (
+                SELECT id
+                FROM job
+                WHERE status = 'queued' AND priority >= $1
+                ORDER BY priority DESC, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        """
+
+        async with self.__guard() as conn:
+            data = await conn.fetchrow(
+                query,
+                min_priority,
+            )
+
+        return _job(data) if data is not None else None
+
+    async def requeue_running_jobs(self) -> int:
+        """Queue the jobs left running by a previous process again."""
+        query = """
+            UPDATE job SET status = 'queued', updated_at = now()
+            WHERE status = 'running'
+        """
+
+        async with self.__guard() as conn:
+            status = await conn.execute(query)
+
+        return _affected(status)
+
+    async def checkpoint_job(
+        self,
+        id: int,
+        /,
+        checkpoint: dict[str, Any],
+        progress: int,
+        total: Optional[int] = None,
+    ) -> str:
+        """Store the progress of a running job and return its status."""
+        query = """
+            UPDATE job SET
+                checkpoint = $2::jsonb,
+                progress = $3,
+                total = COALESCE($4, total),
+                updated_at = now()
+            WHERE id = $1
+            RETURNING status
+        """
+
+        async with self.__guard() as conn:
+            status = await conn.fetchval(
+                query,
+                id,
+                json.dumps(checkpoint),
+                progress,
+                total,
+            )
+
+        return cast(str, status)
+
+    async def finish_job(
+        self, id: int, /, status: str, error: Optional[str] = None
+    ) -> None:
+        """Mark a running job as done or failed."""
+        query = """
+            UPDATE job SET status = $2, error = $3, updated_at = now()
+            WHERE id = $1 AND status = 'running'
+        """
+
+        async with self.__guard() as conn:
+            await conn.execute(query, id, status, error)
+
+    async def cancel_job(self, id: int, guild_id: int) -> Optional[JobData]:
+        """Cancel a job of the guild that has not finished yet."""
+        query = """
+            UPDATE job SET status = 'cancelled', updated_at = now()
+            WHERE id = $1 AND guild_id = $2 AND status IN ('queued', 'running')
+            RETURNING *
+        """
+
+        async with self.__guard() as conn:
+            data = await conn.fetchrow(
+                query,
+                id,
+                guild_id,
+            )
+
+        return _job(data) if data is not None else None
+
+    async def fetch_jobs(self, guild_id: int, limit: int) -> list[JobData]:
+        """Return the latest jobs of a guild, newest first."""
+        query = """
+            SELECT *
+            FROM job
+            WHERE guild_id = $1
+            ORDER BY id DESC
+            LIMIT $2
+        """
+
+        async with self.__guard(read=True) as conn:
+            entries = await conn.fetch(
+                query,
+                guild_id,
+                limit,
+            )
+
+        return [_job(data) for data in entries]
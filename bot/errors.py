@@ -66,9 +66,42 @@ class InvalidParameterError(CheckFailure):
     content = "The information provided to the command was invalid"
 
 
+class RateLimitedError(CheckFailure):
+    """Represents a command rejected to protect the bot from overload."""
+
+    title = "Slow Down"
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            content="This command is used a lot right now, please try again "
+            "in %.0f seconds" % max(1, retry_after)
+        )
+        self.retry_after = retry_after
+
+
 class TransformationError(InvalidParameterError):
     """Represents an error state when a transformation fails."""
 
 
+class EditConflictError(InternalError):
+    """Represents an edit based on data that has since been changed."""
+
+    title = "Edit Conflict"
+    content = (
+        "the team was changed while this edit was made. the latest version "
+        "has been loaded, please review it and try again"
+    )
+
+
 class InitializationError(InternalError):
     """Represents an error state when the bot should be logged in but is not."""
+
+
+class DatabaseUnavailableError(InternalError):
+    """Represents an error state when the database can not be reached."""
+
+    title = "Service Degraded"
+    content = (
+        "the database is currently unavailable. cached information is shown "
+        "where possible, please try again shortly"
+    )
@@ -1,14 +1,20 @@
+import asyncio
+import io
 import logging
-from typing import TYPE_CHECKING
+import tracemalloc
+from typing import Literal, TYPE_CHECKING
 
 import discord
+import discord.ui as dui
 from discord import app_commands
 from discord.app_commands import Choice
 from discord.ext import commands
 
 from bot import errors
 from bot.client import Phoenix
-from bot.utils import checks
+from bot.model.members import MemberSet
+from bot.model.team import Team, TeamGuild
+from bot.utils import HeapTracker, StackSampler, checks, object_counts
 
 if TYPE_CHECKING:
     from bot.utils.types import Context, Interaction
@@ -16,6 +22,13 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# The longest a profile may run and the number of hot functions summarized
+PROFILE_MAX_SECONDS = 120
+PROFILE_TOP = 15
+
+# The objects counted by heap reports
+HEAP_COUNTED_TYPES = (Team, TeamGuild, MemberSet, discord.Member, dui.View)
+
 
 class SyncFlags(commands.FlagConverter, delimiter=" ", prefix="--"):
     """A `FlagConverter` to build extra options for the sync command."""
@@ -36,6 +49,7 @@ class Main(commands.Cog, name="terminal"):
 
     def __init__(self, client: Phoenix) -> None:
         self.client = client
+        self.heap = HeapTracker()
 
         logger.info("%s initialized" % __name__)
 
@@ -74,6 +88,130 @@ class Main(commands.Cog, name="terminal"):
             content="Synced %i commands" % num_commands, delete_after=5
         )
 
+    @commands.command(name="footprint")
+    @checks.bot_dev()
+    async def _footprint(self, ctx: "Context") -> None:
+        """Report the memory used by the member sets and the member cache."""
+        live, nbytes = MemberSet.footprint()
+
+        await ctx.send(
+            "%i cached member sets using %.1f KiB\n%s"
+            % (live, nbytes / 1024, self.client.gateway_report())
+        )
+
+    @commands.command(name="locks")
+    @checks.bot_dev()
+    async def _locks(self, ctx: "Context") -> None:
+        """Report the contention of the team locks."""
+        locks = self.client.team_locks
+        stats = locks.stats
+
+        await ctx.send(
+            "%i held, %i waiting | %i acquired, %i contended, "
+            "mean wait %.3fs, max wait %.3fs"
+            % (
+                locks.held,
+                locks.waiting,
+                stats.acquired,
+                stats.contended,
+                stats.mean_wait,
+                stats.max_wait,
+            )
+        )
+
+    @commands.command(name="profile")
+    @checks.bot_dev()
+    async def _profile(self, ctx: "Context", seconds: float = 10) -> None:
+        """Sample the stacks of the running bot for the provided seconds.
+
+        Replies with the hottest functions and a collapsed stack file that can
+        be rendered by flamegraph tools.
+        """
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise errors.InvalidParameterError(
+                content="seconds must be between 0 and %i" % PROFILE_MAX_SECONDS
+            )
+
+        message = await ctx.send("Profiling for %gs" % seconds)
+
+        sampler = StackSampler(asyncio.get_running_loop())
+        profile = await sampler.profile(seconds)
+
+        samples = profile.samples or 1
+        lines = [
+            f"{own / samples:6.1%} {total / samples:6.1%}  {frame}"
+            for frame, own, total in profile.top(PROFILE_TOP)
+        ]
+        summary = "\n".join(["  self  total  function", *lines])[:1900]
+
+        await message.edit(
+            content="%i samples over %.1fs\n```\n%s\n```"
+            % (profile.samples, profile.duration, summary),
+            attachments=[
+                discord.File(
+                    io.BytesIO(profile.collapsed().encode()),
+                    filename="profile.folded",
+                )
+            ],
+        )
+
+    @commands.command(name="heap")
+    @checks.bot_dev()
+    async def _heap(
+        self,
+        ctx: "Context",
+        action: Literal["count", "start", "snapshot", "diff", "stop"] = "count",
+        frames: int = 1,
+    ) -> None:
+        """Inspect the memory of the running bot.
+
+        `start` begins tracing allocations with `frames` frames per trace,
+        `snapshot` takes a baseline, `diff` reports the growth since the last
+        snapshot and `stop` ends tracing. Every report includes the number of
+        live objects of interest, which is all `count` reports.
+        """
+        report = None
+
+        try:
+            if action == "start":
+                self.heap.start(frames)
+            elif action == "stop":
+                self.heap.stop()
+            elif action == "snapshot":
+                report = self.heap.snapshot()
+            elif action == "diff":
+                report = self.heap.diff()
+        except RuntimeError as e:
+            raise errors.InvalidInvocationError(content=str(e)) from e
+
+        await self.__send_heap_report(ctx, report)
+
+    async def __send_heap_report(
+        self, ctx: "Context", report: str | None = None
+    ) -> None:
+        """Send the object counts and an optional report as an attachment."""
+        counts = object_counts(HEAP_COUNTED_TYPES)
+        lines = ["Live objects", ""]
+        lines += [f"{count:>12} {name}" for name, count in counts.items()]
+
+        if self.heap.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            lines += [
+                "",
+                f"Traced memory {current / 2**20:.1f} MiB, "
+                f"peak {peak / 2**20:.1f} MiB",
+            ]
+
+        if report is not None:
+            lines += ["", report]
+
+        await ctx.send(
+            file=discord.File(
+                io.BytesIO("\n".join(lines).encode()),
+                filename="heap-report.txt",
+            )
+        )
+
     @app_commands.command(name="reload", description="reloads a bot extension")
     @app_commands.describe(extension="the extension to reload")
     @app_commands.guilds(970761243277266944)
@@ -82,12 +220,12 @@ class Main(commands.Cog, name="terminal"):
         """Reload or load an extension."""
         try:
             await self.client.reload_extension(extension)
-            await interaction.response.send_message(
-                "extension reload successful", ephemeral=True
+            await self.client.tree.respond(
+                interaction, "extension reload successful", ephemeral=True
             )
         except commands.ExtensionError as e:
-            await interaction.response.send_message(
-                "reload failure %s" % str(e)
+            await self.client.tree.respond(
+                interaction, "reload failure %s" % str(e)
             )
             logger.error("reload failure in %s", extension, exc_info=e)
             raise e
@@ -106,7 +244,7 @@ class Main(commands.Cog, name="terminal"):
     @checks.bot_dev()
     async def _kill(self, interaction: "Interaction") -> None:
         """Close the connection to discord and exit the code."""
-        await interaction.response.send_message("TERMINATING")
+        await self.client.tree.respond(interaction, "TERMINATING")
         logger.critical("Terminating connection via command 'kill'")
 
         await interaction.client.close()
@@ -89,7 +89,8 @@ class Main(Gear, name="Schedule"):
             things",
     )
 
-    @request.command(name="schedule")
+    # A modal must be the first response, it can not follow a defer
+    @request.command(name="schedule", extras={"auto_defer": False})
     async def _schedule(self, interaction: Interaction) -> None:
         """Request a schedule change."""
         modal = ScheduleModal()
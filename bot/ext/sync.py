@@ -0,0 +1,117 @@
+import logging
+
+import discord
+
+from bot import constants
+from bot.client import Phoenix
+from bot.model.gear import Gear
+from bot.model.mirror import MembershipMirror
+
+_log = logging.getLogger(__name__)
+
+
+class Main(Gear, name="Team Sync"):
+    """A module keeping the team caches in step with gateway events.
+
+    Member roles handed out or taken away on discord directly are mirrored
+    into the team memberships. Role edits are coalesced and written in
+    batches, since mass role edits produce a burst of member updates.
+
+    Role and guild events patch only the cache entries they affect, so the
+    team caches stay correct without refetching defensively.
+    """
+
+    async def on_load(self) -> None:
+        """Create the membership mirror."""
+        self.mirror = MembershipMirror(
+            self.client.database,
+            self.__mirrored,
+            interval=constants.Sync.role_mirror_interval,
+        )
+
+    async def cog_unload(self) -> None:
+        """Write the membership changes that are still pending."""
+        await self.mirror.flush()
+
+    def __mirrored(
+        self, guild_id: int, team_id: int, added: list[int], removed: list[int]
+    ) -> None:
+        """Apply membership changes written by the mirror to cached teams."""
+        team_guild = self.client.get_cached_team_guild(guild_id)
+        if team_guild is None:
+            return
+
+        if (team := team_guild.get_team(team_id)) is not None:
+            team._apply_members(added=added, removed=removed)
+
+    @Gear.listener()
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        """Mirror gained or lost team member roles into team memberships.
+
+        Only dispatched for cached members, see the lean gateway mode of the
+        client.
+        """
+        if before.roles == after.roles:
+            return
+
+        team_guild = self.client.get_cached_team_guild(after.guild.id)
+        if team_guild is None:
+            return
+
+        was_member = team_guild.member_team_ids(before)
+        is_member = team_guild.member_team_ids(after)
+
+        for team_id in is_member - was_member:
+            self.mirror.record(after.guild.id, team_id, after.id, member=True)
+
+        for team_id in was_member - is_member:
+            self.mirror.record(after.guild.id, team_id, after.id, member=False)
+
+    @Gear.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        """Remove a deleted role from the index and flag its teams."""
+        team_guild = self.client.get_cached_team_guild(role.guild.id)
+        if team_guild is None:
+            return
+
+        for team in team_guild.discard_role(role.id):
+            _log.warning("role %d of %r was deleted", role.id, team)
+
+    @Gear.listener()
+    async def on_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ) -> None:
+        """Rebuild data derived from the teams that use the role."""
+        team_guild = self.client.get_cached_team_guild(after.guild.id)
+        if team_guild is not None and team_guild.uses_role(after.id):
+            team_guild._touch()
+
+    @Gear.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        """Drop the team cache of a guild the bot is no longer in."""
+        self.client.forget_team_guild(guild.id)
+
+    @Gear.listener()
+    async def on_guild_unavailable(self, guild: discord.Guild) -> None:
+        """Revalidate the teams of the guild once it is used again."""
+        team_guild = self.client.get_cached_team_guild(guild.id)
+        if team_guild is not None:
+            team_guild.invalidate()
+
+    @Gear.listener()
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        """Bind the team cache to the guild received after an outage."""
+        team_guild = self.client.get_cached_team_guild(guild.id)
+        if team_guild is None:
+            return
+
+        team_guild.guild = guild
+        for team in team_guild.cached_teams():
+            team_guild._index(team)
+
+
+async def setup(bot: Phoenix) -> None:
+    """Load the team sync module."""
+    await bot.add_cog(Main(bot))
@@ -1,5 +1,11 @@
+import asyncio
+import csv
+import io
 import logging
-from typing import TYPE_CHECKING
+import math
+from collections.abc import Awaitable, Callable
+from tempfile import SpooledTemporaryFile
+from typing import Optional, TYPE_CHECKING
 
 import asyncpg
 import discord
@@ -7,16 +13,32 @@ import discord.ui as dui
 from discord import app_commands
 from discord.utils import get
 
-from bot import errors
+from bot import constants, errors
 from bot.client import Phoenix
 from bot.model.gear import Gear
-from bot.model.team import Team
+from bot.model.jobs import Job, JobPriority
+from bot.model.team import Team, TeamGuild
+from bot.utils import (
+    MemoTransformer,
+    bounded_gather,
+    checks,
+    get_or_fetch_member,
+)
 
 if TYPE_CHECKING:
-    from bot.utils.types import Interaction
+    from bot.utils.types import Interaction, JobData
 
 _log = logging.getLogger(__name__)
 
+# Exports larger than this are spooled to disk instead of held in memory
+EXPORT_SPOOL_SIZE = 1024 * 1024
+IMPORT_MAX_SIZE = 1024 * 1024
+
+# The number of member role edits sent to discord at once by bulk operations
+ROLE_EDIT_CONCURRENCY = 5
+
+CLEAN_JOB = "team.members.clean"
+
 
 class TeamUserEditView(dui.View):
     """A view provided when editing multiple users in a team."""
@@ -25,6 +47,17 @@ class TeamUserEditView(dui.View):
         super().__init__()
         self.team = team
 
+    async def interaction_check(self, interaction: "Interaction") -> bool:  # type: ignore[override]
+        """Refuse edits once the team has been deleted."""
+        if not self.team.deleted:
+            return True
+
+        self.stop()
+        await interaction.response.send_message(
+            f"The team {self.team.name} no longer exists", ephemeral=True
+        )
+        return False
+
     @dui.select(cls=dui.UserSelect, min_values=0, max_values=10)
     async def _user_select(
         self, interaction: "Interaction", select: dui.UserSelect
@@ -42,21 +75,23 @@ class TeamUserEditView(dui.View):
         """Add the selected member(s) to a team."""
         await interaction.response.defer(ephemeral=True)
 
-        for member in self._user_select.values:
-            if not isinstance(member, discord.Member):
-                raise errors.InvalidInvocationError(
-                    content="This command is returning a user rather than a \
-                        server member"
-                )
+        async with interaction.client.team_locks.hold(self.team.id):
+            for member in self._user_select.values:
+                if not isinstance(member, discord.Member):
+                    raise errors.InvalidInvocationError(
+                        content="This command is returning a user rather "
+                        "than a server member"
+                    )
 
-            await self.team.add_member(member)
+                await self.team.add_member(member)
 
-            if member.get_role(self.team.member_role_id) is not None:
-                continue
+                if member.get_role(self.team.member_role_id) is not None:
+                    continue
 
-            await member.add_roles(
-                discord.Object(self.team.member_role_id), reason="add to team"
-            )
+                await member.add_roles(
+                    discord.Object(self.team.member_role_id),
+                    reason="add to team",
+                )
 
         await interaction.followup.send("Members edited", ephemeral=True)
 
@@ -67,38 +102,155 @@ class TeamUserEditView(dui.View):
         """Remove the selected member(s) from a team."""
         await interaction.response.defer(ephemeral=True)
 
-        for member in self._user_select.values:
-            if not isinstance(member, discord.Member):
-                raise errors.InvalidInvocationError(
-                    content="This command is returning a user rather than a \
-                        server member"
+        async with interaction.client.team_locks.hold(self.team.id):
+            for member in self._user_select.values:
+                if not isinstance(member, discord.Member):
+                    raise errors.InvalidInvocationError(
+                        content="This command is returning a user rather "
+                        "than a server member"
+                    )
+
+                await self.team.remove_member(member)
+
+                if member.get_role(self.team.member_role_id) is None:
+                    continue
+
+                await member.remove_roles(
+                    discord.Object(self.team.member_role_id),
+                    reason="remove from team",
                 )
 
-            await self.team.remove_member(member)
+        await interaction.followup.send("Members edited", ephemeral=True)
+
 
-            if member.get_role(self.team.member_role_id) is None:
-                continue
+class TeamListView(dui.View):
+    """A paginated view of teams.
+
+    Only the teams on the requested page have their info computed. Rendered
+    pages are cached until the team data of the guild changes.
+    """
+
+    per_page = 9
+
+    def __init__(
+        self,
+        owner: discord.abc.User,
+        team_guild: TeamGuild,
+        loader: Callable[[], Awaitable[list[Team]]],
+        teams: list[Team],
+    ) -> None:
+        super().__init__(timeout=300)
+
+        self.owner = owner
+        self.team_guild = team_guild
+        self.loader = loader
+        self.teams = teams
+        self.page = 0
+
+        self.__pages: dict[int, discord.Embed] = {}
+        self.__revision = team_guild.revision
+
+    @property
+    def page_count(self) -> int:
+        """The number of pages needed to display every team."""
+        return max(1, math.ceil(len(self.teams) / self.per_page))
 
-            await member.remove_roles(
-                discord.Object(self.team.member_role_id),
-                reason="remove from team",
+    async def interaction_check(self, interaction: "Interaction") -> bool:  # type: ignore[override]
+        """Allow only the user who requested the list to navigate it."""
+        if interaction.user.id != self.owner.id:
+            await interaction.response.send_message(
+                "Only the user who requested this list can change pages",
+                ephemeral=True,
             )
+            return False
 
-        await interaction.followup.send("Members edited", ephemeral=True)
+        if retry_after := interaction.client.throttle.acquire(
+            "list",
+            guild_id=self.team_guild.guild.id,
+            user_id=interaction.user.id,
+        ):
+            error = errors.RateLimitedError(retry_after)
+            await interaction.response.send_message(
+                embed=error.format_notif_embed(interaction), ephemeral=True
+            )
+            return False
+
+        return True
+
+    async def render(self) -> discord.Embed:
+        """Return the embed of the current page, building it if needed."""
+        if self.__revision != self.team_guild.revision:
+            self.teams = await self.loader()
+            self.__pages.clear()
+            self.__revision = self.team_guild.revision
+
+        self.page = min(self.page, self.page_count - 1)
+        self._previous.disabled = self.page == 0
+        self._next.disabled = self.page >= self.page_count - 1
+
+        embed = self.__pages.get(self.page)
+        if embed is not None:
+            return embed
 
+        revision = self.team_guild.revision
+        start = self.page * self.per_page
 
-class TeamTransformer(app_commands.Transformer):
-    """A transformer for Teams."""
+        embed = discord.Embed(title="Team List")
+        embed.set_footer(text=f"Page {self.page + 1}/{self.page_count}")
+
+        teams = self.teams[start : start + self.per_page]
+        infos = await asyncio.gather(*(team.define_info() for team in teams))
+        for team, info in zip(teams, infos, strict=True):
+            embed.add_field(name=team.name, value=info, inline=True)
+
+        if not self.teams:
+            embed.description = "No teams found"
+
+        # Data changed while the page was built, it must not be reused
+        if revision == self.team_guild.revision:
+            self.__pages[self.page] = embed
+
+        return embed
+
+    @dui.button(label="Previous", style=discord.ButtonStyle.grey)
+    async def _previous(
+        self, interaction: "Interaction", button: dui.Button
+    ) -> None:
+        """Show the previous page."""
+        self.page = max(0, self.page - 1)
 
-    async def transform(self, interaction: "Interaction", value: str) -> Team:
-        """Transform the value into a team."""
+        await interaction.response.edit_message(
+            embed=await self.render(), view=self
+        )
+
+    @dui.button(label="Next", style=discord.ButtonStyle.grey)
+    async def _next(
+        self, interaction: "Interaction", button: dui.Button
+    ) -> None:
+        """Show the next page."""
+        self.page += 1
+
+        await interaction.response.edit_message(
+            embed=await self.render(), view=self
+        )
+
+
+class TeamTransformer(MemoTransformer):
+    """A transformer for Teams.
+
+    The resolved team is memoized on the interaction, so the lead check in
+    `Main.interaction_check` and the command parameter share one lookup.
+    """
+
+    async def resolve(self, interaction: "Interaction", value: str) -> Team:
+        """Resolve the value into a team."""
         if interaction.guild is None:
             raise errors.InvalidInvocationError
 
         client = interaction.client
         team_guild = client.get_team_guild(interaction.guild)
 
-        teams = await team_guild.fetch_teams()
+        teams = await team_guild.read_teams()
         team = get(teams, name=value)
 
         if team is None:
@@ -118,9 +270,16 @@ class TeamTransformer(app_commands.Transformer):
             raise errors.InvalidInvocationError
 
         client = interaction.client
+        if client.throttle.acquire(
+            "autocomplete",
+            guild_id=interaction.guild.id,
+            user_id=interaction.user.id,
+        ):
+            return []
+
         team_guild = client.get_team_guild(interaction.guild)
 
-        teams = await team_guild.fetch_teams()
+        teams = await team_guild.read_teams()
 
         def contains(x: Team) -> bool:
             return value in x.name
@@ -155,6 +314,10 @@ class Main(Gear, name="Teams"):
     )
     team.add_command(manage)
 
+    async def on_load(self) -> None:
+        """Register the handlers of the team jobs."""
+        self.client.jobs.register(CLEAN_JOB, self._clean_members)
+
     async def team_info(self, team: Team) -> discord.Embed:
         """Create a simple embed of team info to return."""
         return discord.Embed(
@@ -204,24 +367,34 @@ class Main(Gear, name="Teams"):
 
             return True
 
-        # Check if interaction invoker has the team lead role
-        team = await TeamTransformer().transform(interaction, team_name)
+        # Check if interaction invoker has the team lead role. The resolution
+        # is memoized and reused when the parameter itself is transformed.
+        # discord.py only hands check errors that are app command errors to
+        # the tree's error handler, others would leave the interaction hanging
+        try:
+            team = await TeamTransformer().transform(interaction, team_name)
+        except errors.DatabaseUnavailableError as e:
+            raise errors.CheckFailure(title=e.title, content=e.content) from e
 
-        return team.lead_role_id in [r.id for r in member.roles]
+        return self.client.get_team_guild(member.guild).can_manage(member, team)
 
-    @team.command(name="info")
+    @team.command(name="info", extras={"ephemeral": True})
     async def _team_info_info(
         self,
         interaction: "Interaction",
         team: app_commands.Transform[Team, TeamTransformer],
     ) -> None:
         """Return information about a team."""
-        await interaction.response.send_message(
-            embed=await self.team_info(team), ephemeral=True
+        await self.client.tree.respond(
+            interaction, embed=await self.team_info(team), ephemeral=True
         )
 
     @team.command(name="list")
-    async def _team_info_list(self, interaction: "Interaction") -> None:
+    @app_commands.describe(mine="only list the teams you lead")
+    @checks.throttled("list")
+    async def _team_info_list(
+        self, interaction: "Interaction", mine: bool = False
+    ) -> None:
         """Return information about all teams."""
         guild = interaction.guild
         if guild is None:
@@ -229,17 +402,24 @@ class Main(Gear, name="Teams"):
                 content="This command can only be ran in a server."
             )
 
-        teams = await self.client.get_team_guild(guild).fetch_teams()
+        team_guild = self.client.get_team_guild(guild)
+        member = interaction.user
 
-        embed = discord.Embed(title="Team List")
-        for team in teams:
-            embed.add_field(
-                name=team.name, value=await team.define_info(), inline=True
-            )
+        async def load() -> list[Team]:
+            teams = await team_guild.read_teams()
+            if not mine or not isinstance(member, discord.Member):
+                return teams
+
+            led = team_guild.led_team_ids(member)
+            return [team for team in teams if team.id in led]
 
-        await interaction.response.send_message(embed=embed)
+        view = TeamListView(member, team_guild, load, await load())
+
+        await self.client.tree.respond(
+            interaction, embed=await view.render(), view=view
+        )
 
-    @team.command(name="memberlist")
+    @team.command(name="memberlist", extras={"ephemeral": True})
     async def _team_info_members(
         self,
         interaction: "Interaction",
@@ -253,9 +433,62 @@ class Main(Gear, name="Teams"):
         if result is None or result == "":
             result = "No members in the team"
 
-        await interaction.response.send_message(result, ephemeral=True)
+        if len(result) > 2000:
+            result = (
+                f"{team.name} has too many members to list here, "
+                "use `/team export` for the full roster"
+            )
+
+        await self.client.tree.respond(interaction, result, ephemeral=True)
+
+    @team.command(name="export", extras={"ephemeral": True})
+    @app_commands.describe(team="the team to export, every team if not given")
+    @checks.throttled("bulk")
+    async def _team_export(
+        self,
+        interaction: "Interaction",
+        team: Optional[app_commands.Transform[Team, TeamTransformer]] = None,
+    ) -> None:
+        """Export team rosters as a csv file.
 
-    @members.command(name="add")
+        Administrators export every team in the server when no team is given,
+        leads export the teams they lead.
+        """
+        member = interaction.user
+        if not isinstance(member, discord.Member):
+            raise errors.InvalidInvocationError(
+                content="This command can only be ran in a server."
+            )
+
+        await self.client.tree.defer(interaction, ephemeral=True)
+
+        team_guild = self.client.get_team_guild(member.guild)
+
+        teams: Optional[list[Team]] = None
+        if team is not None:
+            teams = [team]
+        elif not member.guild_permissions.administrator:
+            # The lead index is built when the teams are loaded
+            all_teams = await team_guild.read_teams()
+            led = team_guild.led_team_ids(member)
+            teams = [t for t in all_teams if t.id in led]
+
+            if not teams:
+                raise errors.InvalidAuthorizationError(
+                    content="You do not lead any teams to export"
+                )
+
+        filename = "roster-%d.csv" % (team.id if team else member.guild.id)
+        with SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as output:
+            await team_guild.export_roster(output, teams=teams)
+            output.seek(0)
+
+            await interaction.followup.send(
+                file=discord.File(output, filename=filename),  # type: ignore[arg-type]
+                ephemeral=True,
+            )
+
+    @members.command(name="add", extras={"ephemeral": True})
     async def _team_members_add(
         self,
         interaction: "Interaction",
@@ -263,19 +496,21 @@ class Main(Gear, name="Teams"):
         member: discord.Member,
     ) -> None:
         """Add a member to a team."""
-        await team.add_member(member)
+        async with self.client.team_locks.hold(team.id):
+            await team.add_member(member)
 
-        await member.add_roles(
-            discord.Object(team.member_role_id), reason="add to team"
-        )
+            await member.add_roles(
+                discord.Object(team.member_role_id), reason="add to team"
+            )
 
-        await interaction.response.send_message(
+        await self.client.tree.respond(
+            interaction,
             f"{member.mention} added to {team.name}",
             allowed_mentions=discord.AllowedMentions.none(),
             ephemeral=True,
         )
 
-    @members.command(name="remove")
+    @members.command(name="remove", extras={"ephemeral": True})
     async def _team_members_remove(
         self,
         interaction: "Interaction",
@@ -283,70 +518,268 @@ class Main(Gear, name="Teams"):
         user: discord.User,
     ) -> None:
         """Remove a member from a team."""
-        await team.remove_member(user)
-
-        guild = interaction.guild
-        if (
-            guild is not None
-            and (member := await guild.fetch_member(user.id)) is not None
-        ):
-            await member.remove_roles(
-                discord.Object(team.member_role_id),
-                reason="remove from team",
-            )
+        async with self.client.team_locks.hold(team.id):
+            await team.remove_member(user)
+
+            guild = interaction.guild
+            if (
+                guild is not None
+                and (member := await get_or_fetch_member(guild, user.id))
+                is not None
+            ):
+                await member.remove_roles(
+                    discord.Object(team.member_role_id),
+                    reason="remove from team",
+                )
 
-        await interaction.response.send_message(
+        await self.client.tree.respond(
+            interaction,
             f"{user.mention} removed from {team.name}",
             allowed_mentions=discord.AllowedMentions.none(),
             ephemeral=True,
         )
         return
 
-    @members.command(name="edit")
+    def __check_manageable(
+        self, member: discord.Member | discord.User, teams: list[Team]
+    ) -> None:
+        """Ensure the invoker can manage every team besides the `team` one.
+
+        The interaction check only covers the `team` parameter.
+        """
+        if not isinstance(member, discord.Member):
+            raise errors.InvalidInvocationError(
+                content="This command can only be ran in a server."
+            )
+
+        if member.guild_permissions.administrator:
+            return
+
+        team_guild = self.client.get_team_guild(member.guild)
+        for team in teams:
+            if not team_guild.can_manage(member, team):
+                raise errors.InvalidAuthorizationError(
+                    content=f"You do not lead the team {team.name}"
+                )
+
+    @members.command(name="move", extras={"ephemeral": True})
+    async def _team_members_move(
+        self,
+        interaction: "Interaction",
+        member: discord.Member,
+        team: app_commands.Transform[Team, TeamTransformer],
+        target: app_commands.Transform[Team, TeamTransformer],
+    ) -> None:
+        """Move a member from one team to another."""
+        if team.id == target.id:
+            raise errors.InvalidParameterError(
+                content="The member can not be moved to the same team"
+            )
+
+        self.__check_manageable(interaction.user, [target])
+        team_guild = self.client.get_team_guild(member.guild)
+
+        async with self.client.team_locks.hold_many((team.id, target.id)):
+            await team_guild.move_member(member, team, target)
+
+        await self.client.tree.respond(
+            interaction,
+            f"{member.mention} moved from {team.name} to {target.name}",
+            allowed_mentions=discord.AllowedMentions.none(),
+            ephemeral=True,
+        )
+
+    @members.command(name="add-many", extras={"ephemeral": True})
+    async def _team_members_add_many(
+        self,
+        interaction: "Interaction",
+        member: discord.Member,
+        team: app_commands.Transform[Team, TeamTransformer],
+        team_2: app_commands.Transform[Team, TeamTransformer],
+        team_3: Optional[app_commands.Transform[Team, TeamTransformer]] = None,
+    ) -> None:
+        """Add a member to several teams at once."""
+        teams = list({t.id: t for t in (team, team_2, team_3) if t}.values())
+
+        self.__check_manageable(interaction.user, teams)
+        team_guild = self.client.get_team_guild(member.guild)
+
+        async with self.client.team_locks.hold_many(t.id for t in teams):
+            await team_guild.change_memberships(
+                member, add=teams, reason="add to teams"
+            )
+
+        await self.client.tree.respond(
+            interaction,
+            f"{member.mention} added to {', '.join(t.name for t in teams)}",
+            allowed_mentions=discord.AllowedMentions.none(),
+            ephemeral=True,
+        )
+
+    @members.command(name="edit", extras={"ephemeral": True})
     async def _team_members_edit(
         self,
         interaction: "Interaction",
         team: app_commands.Transform[Team, TeamTransformer],
     ) -> None:
         """Edit members on a team."""
-        await interaction.response.send_message(
+        await self.client.tree.respond(
+            interaction,
             f"Select up to 10 members to add to the team {team.name}",
             ephemeral=True,
             view=TeamUserEditView(team),
         )
 
-    @members.command(name="clean")
-    async def _team_members_clean(
+    @members.command(name="enroll", extras={"ephemeral": True})
+    @checks.throttled("bulk")
+    async def _team_members_enroll(
         self,
         interaction: "Interaction",
         team: app_commands.Transform[Team, TeamTransformer],
+        role: discord.Role,
+        role_2: Optional[discord.Role] = None,
+        role_3: Optional[discord.Role] = None,
     ) -> None:
-        """Clear all the members from a team."""
-        guild = interaction.guild
-        if guild is None:
-            raise errors.InvalidInvocationError(
-                content="This command can only be ran in a server."
+        """Add every server member holding any of the roles to a team.
+
+        Only the holders who are not members yet are written, with a single
+        insert, then the member role is applied to those who lack it.
+        """
+        roles = [r for r in (role, role_2, role_3) if r is not None]
+        if any(r.is_default() for r in roles):
+            raise errors.InvalidParameterError(
+                content="Members can not be enrolled by the everyone role"
             )
 
-        failed = []
+        guild = roles[0].guild
+        await self.client.tree.defer(interaction, ephemeral=True)
 
-        await interaction.response.defer(ephemeral=True)
+        # Role holders are read from the member cache
+        await self.client.ensure_chunked(guild)
 
-        mem_ids = await team.fetch_members()
-        for member_id in mem_ids:
-            try:
-                await team.remove_member(discord.Object(member_id))
+        holders = {m.id: m for r in roles for m in r.members if not m.bot}
 
-                member = await guild.fetch_member(member_id)
-                await member.remove_roles(discord.Object(team.member_role_id))
-            except Exception:
-                failed.append(member_id)
+        async with self.client.team_locks.hold(team.id):
+            members = await team.fetch_member_set()
+            inserted = await team.add_members(
+                id for id in holders if id not in members
+            )
 
-        failed_for = [f"<@{id}>" for id in failed]
-        await interaction.edit_original_response(
-            content=f"Completed interaction\nFailed for {failed_for}",
-            allowed_mentions=discord.AllowedMentions.none(),
+            missing_role = [
+                m
+                for m in holders.values()
+                if m.get_role(team.member_role_id) is None
+            ]
+            results = await bounded_gather(
+                (
+                    m.add_roles(
+                        discord.Object(team.member_role_id),
+                        reason="team enroll",
+                    )
+                    for m in missing_role
+                ),
+                limit=ROLE_EDIT_CONCURRENCY,
+            )
+
+        failed = sum(isinstance(r, BaseException) for r in results)
+        content = (
+            f"Enrolled {len(inserted)} of {len(holders)} role holders "
+            f"into {team.name}"
         )
+        if failed:
+            content += f", the role could not be applied to {failed}"
+
+        await self.client.tree.respond(interaction, content, ephemeral=True)
+
+    @members.command(name="clean", extras={"ephemeral": True})
+    @checks.throttled("bulk")
+    async def _team_members_clean(
+        self,
+        interaction: "Interaction",
+        team: app_commands.Transform[Team, TeamTransformer],
+    ) -> None:
+        """Clear all the members from a team.
+
+        The members are removed by a background job, which survives restarts
+        and can be followed with `/team manage jobs`. Cleaning a team that is
+        already being cleaned returns the existing job.
+        """
+        job = await self.client.jobs.enqueue(
+            CLEAN_JOB,
+            team.guild_id,
+            {"team_id": team.id},
+            priority=JobPriority.INTERACTIVE,
+            created_by=interaction.user.id,
+        )
+
+        await self.client.tree.respond(
+            interaction,
+            f"Removing the members of {team.name} as job #{job['id']}",
+            ephemeral=True,
+        )
+
+    async def _clean_members(self, job: Job) -> None:
+        """Remove every member from a team, the handler of clean jobs.
+
+        The member role is removed before the membership, so a member whose
+        role could not be removed stays on the team and is reported. Both steps
+        are idempotent, which lets an interrupted job simply run again.
+        """
+        guild = self.client.get_guild(job.guild_id)
+        if guild is None:
+            raise errors.InvalidInvocationError(content="Server unavailable")
+
+        team = await self.client.get_team_guild(guild).fetch_team(
+            job.payload["team_id"]
+        )
+        if team is None:
+            return
+
+        checkpoint = job.checkpoint or {"failed": []}
+        failed: set[int] = set(checkpoint["failed"])
+
+        # Membership may have changed while the job was queued
+        team.invalidate_members()
+        await self.client.ensure_chunked(guild)
+        remaining = [
+            id for id in await team.fetch_members() if id not in failed
+        ]
+
+        progress = job.progress
+        total = job.total or len(remaining)
+
+        # The team is locked per batch, other edits may run between batches
+        batch = constants.Jobs.checkpoint_every
+        for start in range(0, len(remaining), batch):
+            async with self.client.team_locks.hold(team.id):
+                if team.deleted:
+                    return
+
+                for member_id in remaining[start : start + batch]:
+                    try:
+                        member = await get_or_fetch_member(guild, member_id)
+                        await member.remove_roles(
+                            discord.Object(team.member_role_id),
+                            reason="team clean",
+                        )
+                    except discord.NotFound:
+                        pass
+                    except discord.HTTPException:
+                        failed.add(member_id)
+
+                    if member_id not in failed:
+                        await team.remove_member(discord.Object(member_id))
+
+                    progress += 1
+
+            await job.save(
+                {"failed": sorted(failed)}, progress=progress, total=total
+            )
+
+        if failed:
+            raise RuntimeError(
+                "roles could not be removed from %d members" % len(failed)
+            )
 
     @manage.command(name="create")
     async def _team_manage_create(
@@ -368,12 +801,139 @@ class Main(Gear, name="Teams"):
                 name=name, lead_role=lead, member_role=role
             )
 
-            await interaction.response.send_message(f"{team.name} was created")
+            await self.client.tree.respond(
+                interaction, f"{team.name} was created"
+            )
         except asyncpg.UniqueViolationError:
-            await interaction.response.send_message(
-                f"A team with name `{name}` already exists in this server"
+            await self.client.tree.respond(
+                interaction,
+                f"A team with name `{name}` already exists in this server",
+            )
+            return
+
+        # Role changes of the guild's members are only seen once cached
+        self.client.chunk_in_background(guild)
+
+    @manage.command(name="import", extras={"ephemeral": True})
+    @checks.throttled("bulk")
+    @app_commands.describe(
+        file="a csv file with a team name and a user id or username per row"
+    )
+    async def _team_manage_import(
+        self, interaction: "Interaction", file: discord.Attachment
+    ) -> None:
+        """Add members to teams from a csv file.
+
+        Every row holds a team name and a user id or username. The rows are
+        merged into the teams in one transaction, then the member roles are
+        applied. A report with the result of every row is returned.
+        """
+        guild = interaction.guild
+        if guild is None:
+            raise errors.InvalidInvocationError(
+                content="This command can only be ran in a server."
+            )
+
+        if file.size > IMPORT_MAX_SIZE:
+            raise errors.InvalidParameterError(
+                content="The import file can be at most 1 MiB"
             )
 
+        await self.client.tree.defer(interaction, ephemeral=True)
+
+        try:
+            text = (await file.read()).decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise errors.InvalidParameterError(
+                content="The import file must be a utf-8 encoded csv file"
+            ) from e
+
+        # Users are resolved from the member cache
+        await self.client.ensure_chunked(guild)
+
+        team_guild = self.client.get_team_guild(guild)
+        teams = {team.name: team for team in await team_guild.fetch_teams()}
+
+        # Each report entry is [line, team, user, status]
+        report: list[list[str]] = []
+        resolved: list[tuple[list[str], Team, discord.Member]] = []
+
+        for line, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                continue
+
+            if line == 1 and [c.lower() for c in cells[:2]] == ["team", "user"]:
+                continue
+
+            padded = [*cells, "", ""]
+            entry = [str(line), padded[0], padded[1], ""]
+            report.append(entry)
+
+            if len(cells) != 2:
+                entry[3] = "invalid row"
+                continue
+
+            team_name, user = cells
+            if (team := teams.get(team_name)) is None:
+                entry[3] = "unknown team"
+                continue
+
+            if user.isdigit():
+                member = guild.get_member(int(user))
+            else:
+                member = guild.get_member_named(user)
+
+            if member is None:
+                entry[3] = "unknown server member"
+                continue
+
+            resolved.append((entry, team, member))
+
+        team_ids = {team.id for _, team, _ in resolved}
+        async with self.client.team_locks.hold_many(team_ids):
+            inserted = await team_guild.import_members(
+                (team, member.id) for _, team, member in resolved
+            )
+
+            for entry, team, member in resolved:
+                added = (team.id, member.id) in inserted
+                entry[3] = "added" if added else "already a member"
+
+            missing_role = [
+                (entry, team, member)
+                for entry, team, member in resolved
+                if member.get_role(team.member_role_id) is None
+            ]
+            results = await bounded_gather(
+                (
+                    member.add_roles(
+                        discord.Object(team.member_role_id),
+                        reason="team import",
+                    )
+                    for _, team, member in missing_role
+                ),
+                limit=ROLE_EDIT_CONCURRENCY,
+            )
+
+        for (entry, _, _), result in zip(missing_role, results, strict=True):
+            if isinstance(result, BaseException):
+                entry[3] += ", role not applied"
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["line", "team", "user", "status"])
+        writer.writerows(report)
+
+        await interaction.followup.send(
+            f"Imported {len(inserted)} of {len(report)} rows",
+            file=discord.File(
+                io.BytesIO(output.getvalue().encode()),
+                filename="import-report.csv",
+            ),
+            ephemeral=True,
+        )
+
     @manage.command(name="edit")
     async def _team_manage_edit(
         self,
@@ -384,9 +944,10 @@ class Main(Gear, name="Teams"):
         role: discord.Role | None,
     ) -> None:
         """Edit the provided properties of a provided team."""
-        await interaction.response.defer()
+        await self.client.tree.defer(interaction)
 
-        await team.edit(name=name, lead_role=lead, member_role=role)
+        async with self.client.team_locks.hold(team.id):
+            await team.edit(name=name, lead_role=lead, member_role=role)
         # TODO: update member roles to new role
 
         await interaction.followup.send(
@@ -394,6 +955,64 @@ class Main(Gear, name="Teams"):
             embed=await self.team_info(team),
         )
 
+    @manage.command(name="jobs", extras={"ephemeral": True})
+    async def _team_manage_jobs(self, interaction: "Interaction") -> None:
+        """List the latest background jobs of the server."""
+        guild = interaction.guild
+        if guild is None:
+            raise errors.InvalidInvocationError(
+                content="This command can only be ran in a server."
+            )
+
+        jobs = await self.client.jobs.fetch_jobs(guild.id)
+
+        embed = discord.Embed(
+            title="Jobs",
+            description="\n".join(map(self.describe_job, jobs))
+            or "No jobs found",
+        )
+        await self.client.tree.respond(interaction, embed=embed, ephemeral=True)
+
+    @manage.command(name="cancel", extras={"ephemeral": True})
+    @app_commands.describe(job="the id of the job to cancel")
+    async def _team_manage_cancel(
+        self, interaction: "Interaction", job: int
+    ) -> None:
+        """Cancel a background job that has not finished yet."""
+        guild = interaction.guild
+        if guild is None:
+            raise errors.InvalidInvocationError(
+                content="This command can only be ran in a server."
+            )
+
+        data = await self.client.jobs.cancel(job, guild.id)
+        if data is None:
+            raise errors.InvalidParameterError(
+                content="Job #%d does not exist or has already finished" % job
+            )
+
+        await self.client.tree.respond(
+            interaction, self.describe_job(data), ephemeral=True
+        )
+
+    @staticmethod
+    def describe_job(job: "JobData") -> str:
+        """Build a single line summary of a job."""
+        total = job["total"] if job["total"] is not None else "?"
+        line = (
+            f"`#{job['id']}` {job['kind']} **{job['status']}** "
+            f"{job['progress']}/{total}, "
+            f"queued <t:{job['created_at'].timestamp():.0f}:R>"
+        )
+
+        if job["created_by"] is not None:
+            line += f" by <@{job['created_by']}>"
+
+        if job["error"] is not None:
+            line += f"\n> {job['error']}"
+
+        return line
+
     @manage.command(name="delete")
     async def _team_manage_delete(
         self,
@@ -402,9 +1021,11 @@ class Main(Gear, name="Teams"):
     ) -> None:
         """Delete a team."""
         # TODO: clean the team members
-        await team.delete()
+        async with self.client.team_locks.hold(team.id):
+            await team.delete()
 
-        await interaction.response.send_message(
+        await self.client.tree.respond(
+            interaction,
             "%s was deleted" % team.name,
         )
 
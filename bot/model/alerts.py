@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import logging
+import time
+import traceback
+from collections.abc import Awaitable, Callable
+from typing import Optional
+
+_log = logging.getLogger(__name__)
+
+
+def _unwrap(error: BaseException) -> BaseException:
+    """Return the exception raised by the failing code itself.
+
+    Command errors wrap the original exception, which is what identifies
+    where the failure comes from.
+    """
+    while (original := getattr(error, "original", None)) is not None:
+        error = original
+
+    return error
+
+
+def fingerprint(error: BaseException) -> str:
+    """Return an identifier shared by exceptions raised the same way.
+
+    The type and the frames of the traceback are hashed. Messages are left out
+    since they often contain ids or other values that differ between repeats.
+    """
+    error = _unwrap(error)
+    frames = traceback.extract_tb(error.__traceback__)
+
+    parts = [type(error).__module__, type(error).__qualname__]
+    parts += [f"{f.filename}:{f.name}:{f.lineno}" for f in frames]
+
+    digest = hashlib.blake2b("|".join(parts).encode(), digest_size=6)
+    return digest.hexdigest()
+
+
+class Alert:
+    """The occurrences of one kind of error within a digest window.
+
+    The longest traceback seen is kept as the most informative one.
+    """
+
+    __slots__ = (
+        "fingerprint",
+        "title",
+        "count",
+        "first",
+        "last",
+        "sources",
+        "traceback",
+    )
+
+    def __init__(self, fingerprint: str, error: BaseException) -> None:
+        error = _unwrap(error)
+
+        self.fingerprint = fingerprint
+        self.title = f"{type(error).__qualname__}: {error}"[:200]
+        self.count = 0
+        self.first = time.time()
+        self.last = self.first
+        self.sources: set[str] = set()
+        self.traceback = ""
+
+    def record(self, error: BaseException, source: str) -> None:
+        """Count an occurrence of the error."""
+        self.count += 1
+        self.last = time.time()
+        self.sources.add(source)
+
+        text = "".join(traceback.format_exception(_unwrap(error)))
+        if len(text) > len(self.traceback):
+            self.traceback = text
+
+
+class AlertDigest:
+    """Batches errors into periodic digests.
+
+    Reported errors are grouped by `fingerprint`. Every `interval` seconds the
+    groups collected since the previous digest are handed to `send` at once,
+    so an outage produces one digest per interval rather than one message per
+    error. At most `limit` groups are kept per digest, further kinds of errors
+    are only counted.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[list[Alert], int], Awaitable[None]],
+        *,
+        interval: float = 60.0,
+        limit: int = 25,
+    ) -> None:
+        self.interval = interval
+        self.limit = limit
+
+        self.__send = send
+        self.__pending: dict[str, Alert] = {}
+        self.__dropped = 0
+        self.__flusher: Optional[asyncio.Task[None]] = None
+
+    def report(self, error: BaseException, *, source: str) -> None:
+        """Add an error to the next digest."""
+        key = fingerprint(error)
+
+        alert = self.__pending.get(key)
+        if alert is None:
+            if len(self.__pending) >= self.limit:
+                self.__dropped += 1
+                return
+
+            alert = self.__pending[key] = Alert(key, error)
+
+        alert.record(error, source)
+
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.create_task(self.__flush_later())
+
+    async def __flush_later(self) -> None:
+        """Wait for the digest window to pass and send the digest."""
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Send the pending alerts immediately.
+
+        Failures to send are logged and the digest is discarded, alerting must
+        never produce further alerts.
+        """
+        if not self.__pending and not self.__dropped:
+            return
+
+        alerts = sorted(
+            self.__pending.values(), key=lambda a: a.count, reverse=True
+        )
+        dropped = self.__dropped
+        self.__pending = {}
+        self.__dropped = 0
+
+        try:
+            await self.__send(alerts, dropped)
+        except Exception:
+            _log.exception("alert digest of %d alerts not sent", len(alerts))
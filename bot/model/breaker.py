@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Optional
+
+_log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised by a guarded call while the circuit is open."""
+
+
+class CircuitBreaker:
+    """A circuit breaker that fails fast after repeated failures.
+
+    While closed, guarded calls run normally and consecutive failures are
+    counted. Once `threshold` failures happen in a row the circuit opens:
+    guarded calls fail immediately with `CircuitOpenError` while `probe` is
+    retried in the background every `interval` seconds. The first successful
+    probe closes the circuit again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        /,
+        probe: Callable[[], Awaitable[object]],
+        *,
+        failures: tuple[type[BaseException], ...],
+        threshold: int = 5,
+        interval: float = 5.0,
+    ) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.interval = interval
+
+        self.__probe = probe
+        self.__failures: tuple[type[BaseException], ...] = (
+            TimeoutError,
+            *failures,
+        )
+        self.__count = 0
+        self.__prober: Optional[asyncio.Task[None]] = None
+
+    @property
+    def open(self) -> bool:
+        """A bool indicating if guarded calls currently fail fast."""
+        return self.__prober is not None and not self.__prober.done()
+
+    @asynccontextmanager
+    async def guard(
+        self, timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """Run the enclosed block under the breaker with an optional timeout.
+
+        Timeouts and exceptions of the failure types count as failures, any
+        other outcome resets the failure count.
+        """
+        if self.open:
+            raise CircuitOpenError(self.name)
+
+        try:
+            async with asyncio.timeout(timeout):
+                yield
+        except self.__failures:
+            self.__record_failure()
+            raise
+        except Exception:
+            self.__count = 0
+            raise
+        else:
+            self.__count = 0
+
+    def __record_failure(self) -> None:
+        """Count a failure and open the circuit past the threshold."""
+        self.__count += 1
+        if self.__count < self.threshold or self.open:
+            return
+
+        _log.error(
+            "circuit %s opened after %d consecutive failures",
+            self.name,
+            self.__count,
+        )
+        self.__prober = asyncio.create_task(self.__recover())
+
+    async def __recover(self) -> None:
+        """Probe until the guarded resource responds again."""
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                async with asyncio.timeout(self.interval):
+                    await self.__probe()
+            except Exception:
+                _log.debug("circuit %s probe failed", self.name, exc_info=True)
+                continue
+
+            self.__count = 0
+            _log.warning("circuit %s closed", self.name)
+            return
@@ -28,3 +28,11 @@ class Cache(Generic[K, V]):
 
         self.__cache.move_to_end(key)
         return value
+
+    def pop(self, key: K) -> Optional[V]:
+        """Remove an element from the cache and return it."""
+        return self.__cache.pop(key, None)
+
+    def items(self) -> list[tuple[K, V]]:
+        """Return the cached elements without changing their recency."""
+        return list(self.__cache.items())
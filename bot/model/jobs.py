@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from enum import IntEnum
+from typing import Any, Optional, TYPE_CHECKING
+
+from bot import errors
+from bot.database import Database
+
+if TYPE_CHECKING:
+    from bot.utils.types import JobData
+
+_log = logging.getLogger(__name__)
+
+
+class JobPriority(IntEnum):
+    """The priorities of jobs, higher priorities are run first."""
+
+    BACKGROUND = 0
+    INTERACTIVE = 100
+
+
+class JobCancelledError(Exception):
+    """Raised by `Job.save` once the job has been cancelled."""
+
+
+class Job:
+    """A claimed job that is handed to the handler of its kind.
+
+    Handlers must be idempotent. A job that is interrupted, by a restart for
+    example, is run again from its last checkpoint, so work done after that
+    checkpoint is repeated.
+    """
+
+    def __init__(self, database: Database, /, data: "JobData") -> None:
+        self.__database = database
+
+        self.id = data["id"]
+        self.kind = data["kind"]
+        self.guild_id = data["guild_id"]
+        self.payload = data["payload"]
+        self.checkpoint = data["checkpoint"]
+        self.progress = data["progress"]
+        self.total = data["total"]
+
+    def __repr__(self) -> str:
+        """Define object representation."""
+        return f"<Job id={self.id}, kind={self.kind}>"
+
+    async def save(
+        self,
+        checkpoint: dict[str, Any],
+        *,
+        progress: int,
+        total: Optional[int] = None,
+    ) -> None:
+        """Store the progress of the job.
+
+        Raises `JobCancelledError` if the job was cancelled in the meantime,
+        handlers should let it propagate.
+        """
+        status = await self.__database.checkpoint_job(
+            self.id, checkpoint, progress, total
+        )
+
+        self.checkpoint = checkpoint
+        self.progress = progress
+        if total is not None:
+            self.total = total
+
+        if status == "cancelled":
+            raise JobCancelledError(self.id)
+
+
+Handler = Callable[[Job], Awaitable[None]]
+
+
+class JobQueue:
+    """A pool of workers running the jobs stored in the database.
+
+    `workers` workers run jobs of any priority, and one more worker only runs
+    interactive jobs, so those never wait behind long background jobs. Workers
+    are woken when a job is queued and otherwise check the queue every
+    `poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        /,
+        *,
+        workers: int = 2,
+        poll_interval: float = 30.0,
+    ) -> None:
+        self.workers = workers
+        self.poll_interval = poll_interval
+
+        self.__database = database
+        self.__handlers: dict[str, Handler] = {}
+        self.__wake = asyncio.Event()
+        self.__tasks: list[asyncio.Task[None]] = []
+
+    def register(self, kind: str, handler: Handler) -> None:
+        """Set the handler that runs the jobs of a kind."""
+        self.__handlers[kind] = handler
+
+    async def start(self) -> None:
+        """Resume jobs left running by a previous process and start working."""
+        if self.__tasks:
+            return
+
+        if resumed := await self.__database.requeue_running_jobs():
+            _log.info("resuming %d interrupted jobs", resumed)
+
+        self.__tasks = [
+            asyncio.create_task(self.__work(JobPriority.INTERACTIVE)),
+            *(
+                asyncio.create_task(self.__work(JobPriority.BACKGROUND))
+                for _ in range(self.workers)
+            ),
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers.
+
+        Jobs that were running are left as such and resumed by the next
+        `start`.
+        """
+        for task in self.__tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+
+    async def enqueue(
+        self,
+        kind: str,
+        guild_id: int,
+        payload: dict[str, Any],
+        *,
+        priority: int = JobPriority.BACKGROUND,
+        created_by: Optional[int] = None,
+    ) -> "JobData":
+        """Queue a job and wake the workers.
+
+        Returns the already queued or running job instead if it is identical.
+        """
+        data = await self.__database.create_job(
+            kind,
+            guild_id,
+            payload,
+            priority=priority,
+            created_by=created_by,
+        )
+        self.__wake.set()
+
+        return data
+
+    async def cancel(self, job_id: int, guild_id: int) -> Optional["JobData"]:
+        """Cancel a job of the guild.
+
+        A running job stops at its next checkpoint. Returns None if the job
+        does not exist or has already finished.
+        """
+        return await self.__database.cancel_job(job_id, guild_id)
+
+    async def fetch_jobs(
+        self, guild_id: int, limit: int = 10
+    ) -> list["JobData"]:
+        """Return the latest jobs of a guild."""
+        return await self.__database.fetch_jobs(guild_id, limit)
+
+    async def __work(self, min_priority: int) -> None:
+        """Claim and run jobs until stopped.
+
+        Failures to claim a job never stop the worker, it waits for the next
+        poll before trying again.
+        """
+        while True:
+            try:
+                data = await self.__database.claim_job(min_priority)
+            except errors.DatabaseUnavailableError:
+                data = None
+            except Exception:
+                _log.exception("claiming a job failed")
+                data = None
+
+            if data is None:
+                with suppress(TimeoutError):
+                    async with asyncio.timeout(self.poll_interval):
+                        await self.__wake.wait()
+
+                self.__wake.clear()
+                continue
+
+            await self.__run(Job(self.__database, data))
+
+    async def __run(self, job: Job) -> None:
+        """Run a job with its handler and record the outcome."""
+        handler = self.__handlers.get(job.kind)
+        status, error = "done", None
+
+        _log.info("running %r", job)
+        try:
+            if handler is None:
+                raise LookupError("no handler for job kind %s" % job.kind)
+
+            await handler(job)
+        except JobCancelledError:
+            _log.info("%r cancelled", job)
+            return
+        except Exception as e:
+            _log.exception("%r failed", job)
+            status, error = "failed", str(e) or e.__class__.__name__
+
+        try:
+            await self.__database.finish_job(job.id, status, error)
+        except errors.DatabaseUnavailableError:
+            # The job is resumed from its checkpoint after the next restart
+            _log.warning("outcome of %r could not be stored", job)
+        except Exception:
+            _log.exception("outcome of %r could not be stored", job)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Hashable, Iterable
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any
+
+_log = logging.getLogger(__name__)
+
+
+class LockStats:
+    """Wait time metrics of a `LockManager`."""
+
+    __slots__ = ("acquired", "contended", "total_wait", "max_wait")
+
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """The mean seconds waited for the lock by contended acquisitions."""
+        return self.total_wait / self.contended if self.contended else 0.0
+
+    def record(self, waited: float, contended: bool) -> None:
+        """Count an acquisition that waited the provided seconds."""
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+
+class LockManager:
+    """Mutual exclusion per key, such as per team.
+
+    Holders of the same key run one at a time while different keys never
+    block each other. Waiters are served in the order they arrived, since an
+    `asyncio.Lock` with waiters is never taken by a newcomer first. Locks only
+    exist while they are held or waited on.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stats = LockStats()
+
+        self.__locks: dict[Hashable, asyncio.Lock] = {}
+        self.__users: dict[Hashable, int] = {}
+
+    @property
+    def held(self) -> int:
+        """The number of keys currently locked."""
+        return sum(lock.locked() for lock in self.__locks.values())
+
+    @property
+    def waiting(self) -> int:
+        """The number of tasks currently waiting for a lock."""
+        return sum(self.__users.values()) - self.held
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold the lock of the key for the enclosed block."""
+        lock = self.__locks.get(key)
+        if lock is None:
+            lock = self.__locks[key] = asyncio.Lock()
+
+        self.__users[key] = self.__users.get(key, 0) + 1
+        contended = lock.locked()
+        start = time.perf_counter()
+
+        try:
+            async with lock:
+                waited = time.perf_counter() - start
+                self.stats.record(waited, contended)
+                if contended:
+                    _log.debug("%s %r waited %.3fs", self.name, key, waited)
+
+                yield
+        finally:
+            self.__users[key] -= 1
+            if not self.__users[key]:
+                del self.__users[key]
+                del self.__locks[key]
+
+    @asynccontextmanager
+    async def hold_many(self, keys: Iterable[Any]) -> AsyncIterator[None]:
+        """Hold the locks of several keys for the enclosed block.
+
+        The locks are taken in sorted order, so two holders of overlapping
+        keys can never wait on each other.
+        """
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys)):
+                await stack.enter_async_context(self.hold(key))
+
+            yield
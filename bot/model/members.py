@@ -0,0 +1,105 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from itertools import chain
+
+
+class MemberSet:
+    """An immutable set of user ids backed by a sorted array.
+
+    Every id takes 8 bytes rather than the boxed int and hash slot a builtin
+    set needs. Membership tests use binary search. Changes return a new set,
+    so a set handed out can never change underneath its holder.
+
+    The memory used by every live set is tracked by `footprint`.
+    """
+
+    __slots__ = ("__ids",)
+
+    __live = 0
+    __bytes = 0
+
+    def __init__(self, ids: Iterable[int] = ()) -> None:
+        self.__track(array("Q", sorted(set(ids))))
+
+    @staticmethod
+    def __from_sorted(ids: "array[int]") -> "MemberSet":
+        """Build a set from an array that is already sorted and unique."""
+        member_set = MemberSet.__new__(MemberSet)
+        member_set.__track(ids)
+
+        return member_set
+
+    def __track(self, ids: "array[int]") -> None:
+        self.__ids = ids
+
+        MemberSet.__live += 1
+        MemberSet.__bytes += self.nbytes
+
+    def __del__(self) -> None:
+        """Remove the set from the footprint."""
+        try:
+            nbytes = self.nbytes
+        except AttributeError:
+            return
+
+        MemberSet.__live -= 1
+        MemberSet.__bytes -= nbytes
+
+    @staticmethod
+    def footprint() -> tuple[int, int]:
+        """Return the number of live sets and the bytes they use."""
+        return MemberSet.__live, MemberSet.__bytes
+
+    @property
+    def nbytes(self) -> int:
+        """The bytes used by the set."""
+        return sys.getsizeof(self.__ids)
+
+    def __contains__(self, user_id: object) -> bool:
+        """Check if the id is in the set."""
+        if not isinstance(user_id, int) or user_id < 0:
+            return False
+
+        i = bisect_left(self.__ids, user_id)
+        return i < len(self.__ids) and self.__ids[i] == user_id
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the ids in ascending order."""
+        return iter(self.__ids)
+
+    def __len__(self) -> int:
+        """Return the number of ids in the set."""
+        return len(self.__ids)
+
+    def __repr__(self) -> str:
+        """Define object representation."""
+        return f"<MemberSet size={len(self)}>"
+
+    def with_added(self, user_id: int) -> "MemberSet":
+        """Return a set that also contains the id."""
+        if user_id in self:
+            return self
+
+        i = bisect_left(self.__ids, user_id)
+        ids = self.__ids[:i]
+        ids.append(user_id)
+        ids.extend(self.__ids[i:])
+
+        return MemberSet.__from_sorted(ids)
+
+    def without(self, user_id: int) -> "MemberSet":
+        """Return a set that does not contain the id."""
+        if user_id not in self:
+            return self
+
+        i = bisect_left(self.__ids, user_id)
+        ids = self.__ids[:i]
+        ids.extend(self.__ids[i + 1 :])
+
+        return MemberSet.__from_sorted(ids)
+
+    def union(self, user_ids: Iterable[int]) -> "MemberSet":
+        """Return a set that also contains every provided id."""
+        return MemberSet(chain(self.__ids, user_ids))
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import Optional
+
+from bot import errors
+from bot.database import Database
+
+_log = logging.getLogger(__name__)
+
+# Called with the guild id, team id, added and removed user ids of a team
+Applied = Callable[[int, int, list[int], list[int]], None]
+
+
+class MembershipMirror:
+    """Coalesces membership changes seen on discord into batched writes.
+
+    Changes are recorded as the latest known state of a (team, user) pair, so
+    any number of role edits for the same member within `interval` seconds
+    result in at most a single row written. Pending changes are written
+    together once the interval has passed, and the written changes are passed
+    to `applied` so caches can follow.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        /,
+        applied: Applied,
+        *,
+        interval: float = 2.0,
+    ) -> None:
+        self.interval = interval
+
+        self.__database = database
+        self.__applied = applied
+        # (team id, user id) mapped to the guild id and the membership state
+        self.__pending: dict[tuple[int, int], tuple[int, bool]] = {}
+        self.__flusher: Optional[asyncio.Task[None]] = None
+
+    @property
+    def pending(self) -> int:
+        """The number of changes waiting to be written."""
+        return len(self.__pending)
+
+    def record(
+        self, guild_id: int, team_id: int, user_id: int, *, member: bool
+    ) -> None:
+        """Record that the user gained or lost the membership of a team."""
+        self.__pending[team_id, user_id] = (guild_id, member)
+
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.create_task(self.__flush_later())
+
+    async def __flush_later(self) -> None:
+        """Wait for the interval to pass and write the pending changes."""
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write the pending changes immediately.
+
+        If the database is unavailable the changes are kept, unless newer
+        changes for the same pairs were recorded meanwhile, and retried later.
+        Changes that fail otherwise would fail again on every retry, they are
+        logged and dropped.
+        """
+        if not self.__pending:
+            return
+
+        pending, self.__pending = self.__pending, {}
+        added = [key for key, (_, member) in pending.items() if member]
+        removed = [key for key, (_, member) in pending.items() if not member]
+
+        try:
+            inserted, deleted = await self.__database.apply_memberships(
+                added, removed
+            )
+        except errors.DatabaseUnavailableError:
+            _log.warning("%d membership changes deferred", len(pending))
+
+            self.__pending = pending | self.__pending
+            self.__flusher = asyncio.create_task(self.__flush_later())
+            return
+        except Exception:
+            _log.exception("%d membership changes dropped", len(pending))
+            return
+
+        _log.debug(
+            "mirrored %d changes: %d added, %d removed",
+            len(pending),
+            len(inserted),
+            len(deleted),
+        )
+
+        changes: dict[tuple[int, int], tuple[list[int], list[int]]] = {}
+        for pairs, index in ((inserted, 0), (deleted, 1)):
+            for team_id, user_id in pairs:
+                guild_id, _ = pending[team_id, user_id]
+                entry = changes.setdefault((guild_id, team_id), ([], []))
+                entry[index].append(user_id)
+
+        for (guild_id, team_id), (users, gone) in changes.items():
+            self.__applied(guild_id, team_id, users, gone)
@@ -0,0 +1,111 @@
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bot.utils.types import TeamData
+
+_log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+# A snapshot row: id, name, guild id, lead role id, member role id, version,
+# count
+Row = tuple[int, str, int, int, int, int, Optional[int]]
+Entries = list[tuple["TeamData", Optional[int]]]
+
+
+def dump_snapshot(path: Path, guilds: dict[int, Entries]) -> None:
+    """Write the team caches of the guilds to a compressed snapshot.
+
+    The snapshot is written to a temporary file first and then moved into
+    place, so a crash while writing never leaves a truncated snapshot.
+    """
+    rows: dict[str, list[Row]] = {
+        str(guild_id): [
+            (
+                data["id"],
+                data["name"],
+                data["guild_id"],
+                data["lead_role_id"],
+                data["member_role_id"],
+                data["version"],
+                count,
+            )
+            for data, count in entries
+        ]
+        for guild_id, entries in guilds.items()
+    }
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "created": time.time(),
+        "guilds": rows,
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(temporary, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+
+    os.replace(temporary, path)
+
+
+def load_snapshot(path: Path, max_age: float) -> dict[int, Entries]:
+    """Read a snapshot written by `dump_snapshot`.
+
+    An empty mapping is returned if the snapshot is missing, unreadable, of
+    another version or older than `max_age` seconds.
+    """
+    if not path.is_file():
+        return {}
+
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        _log.warning("team cache snapshot could not be read", exc_info=True)
+        return {}
+
+    if payload.get("version") != SNAPSHOT_VERSION:
+        _log.info("team cache snapshot ignored: version mismatch")
+        return {}
+
+    age = time.time() - payload.get("created", 0)
+    if age > max_age:
+        _log.info("team cache snapshot ignored: %.0fs old", age)
+        return {}
+
+    guilds: dict[int, Entries] = {}
+    try:
+        for guild_id, rows in payload["guilds"].items():
+            guilds[int(guild_id)] = [
+                (
+                    {
+                        "id": id,
+                        "name": name,
+                        "guild_id": team_guild_id,
+                        "lead_role_id": lead_role_id,
+                        "member_role_id": member_role_id,
+                        "version": version,
+                    },
+                    count,
+                )
+                for (
+                    id,
+                    name,
+                    team_guild_id,
+                    lead_role_id,
+                    member_role_id,
+                    version,
+                    count,
+                ) in rows
+            ]
+    except (KeyError, TypeError, ValueError):
+        _log.warning("team cache snapshot ignored: malformed", exc_info=True)
+        return {}
+
+    return guilds
@@ -1,10 +1,15 @@
+import asyncio
 import logging
-from typing import Optional, TYPE_CHECKING
+import time
+from collections.abc import Iterable
+from contextlib import suppress
+from typing import IO, Optional, TYPE_CHECKING
 
 import discord
 
+from bot import constants, errors
 from bot.database import Database
-from bot.model.cache import Cache
+from bot.model.members import MemberSet
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +18,13 @@ if TYPE_CHECKING:
 
 
 class Team:
-    """An object of a team."""
+    """An object of a team.
+
+    A `TeamGuild` hands out at most one live object per team id, so views and
+    commands that hold on to a team observe edits as soon as they happen.
+    `deleted` is set once the team no longer exists, and `missing_role_ids`
+    holds the roles of the team that were deleted on discord.
+    """
 
     __slots__ = (
         "name",
@@ -21,7 +32,13 @@ class Team:
         "id",
         "lead_role_id",
         "member_role_id",
+        "version",
+        "_member_count",
+        "_members",
+        "deleted",
+        "missing_role_ids",
         "__database",
+        "__team_guild",
     )
 
     if TYPE_CHECKING:
@@ -30,9 +47,27 @@ class Team:
         id: int
         lead_role_id: int
         member_role_id: int
+        version: int
+        _member_count: Optional[int]
+        _members: Optional[MemberSet]
+        deleted: bool
+        missing_role_ids: frozenset[int]
         __database: Database
+        __team_guild: Optional["TeamGuild"]
 
-    def __init__(self, database: Database, /, data: "TeamData"):
+    def __init__(
+        self,
+        database: Database,
+        /,
+        data: "TeamData",
+        *,
+        team_guild: Optional["TeamGuild"] = None,
+    ):
+        self.__team_guild = team_guild
+        self._member_count = None
+        self._members = None
+        self.deleted = False
+        self.missing_role_ids = frozenset()
         self._update(data)
         self.__database = database
 
@@ -53,7 +88,19 @@ class Team:
         Displays team id, team name, lead roleid, member roleid and stored
         member count.
         """
-        member_count = len(await self.fetch_members())
+        try:
+            member_count: int | str = await self.fetch_member_count()
+        except errors.DatabaseUnavailableError:
+            member_count = "unavailable"
+
+        warnings = "".join(
+            f"Warning: {name} role {role_id} was deleted\n"
+            for name, role_id in (
+                ("lead", self.lead_role_id),
+                ("member", self.member_role_id),
+            )
+            if role_id in self.missing_role_ids
+        )
 
         return (
             "```"
@@ -61,24 +108,100 @@ class Team:
             f"Lead: {self.lead_role_id}\n"
             f"Role: {self.member_role_id}\n"
             f"Member Count: {member_count}\n"
+            f"{warnings}"
             "```"
         )
 
+    async def fetch_member_set(self) -> MemberSet:
+        """Return the ids of the team members.
+
+        The members are cached after the first fetch and kept current by
+        `add_member` and `remove_member`. Changes made outside of the team
+        object require `invalidate_members`.
+        """
+        if self._members is None:
+            members = await self.__database.fetch_members_from_team(self.id)
+            self._set_members(MemberSet(members))
+
+        return self._members  # type: ignore[return-value]
+
     async def fetch_members(self) -> list[int]:
         """Return a list of user ids that are currently a member of the team."""
-        return await self.__database.fetch_members_from_team(self.id)
+        return list(await self.fetch_member_set())
+
+    async def fetch_member_count(self) -> int:
+        """Return the member count, fetching the members if it is not known."""
+        if self._member_count is None:
+            await self.fetch_member_set()
+
+        return self._member_count or 0
+
+    def invalidate_members(self) -> None:
+        """Drop the cached members after they changed outside of the team."""
+        self._members = None
+        self._member_count = None
+
+        if self.__team_guild is not None:
+            self.__team_guild._touch()
+
+    def _set_members(self, members: MemberSet) -> None:
+        """Replace the cached members and the member count."""
+        self._members = members
+        self._member_count = len(members)
+
+    def _apply_members(
+        self, added: Iterable[int] = (), removed: Iterable[int] = ()
+    ) -> None:
+        """Update the cached members with changes written to the database."""
+        added, removed = list(added), list(removed)
+
+        if self._members is not None:
+            # A single insert into the sorted ids avoids sorting the whole set
+            members = self._members
+            if len(added) == 1:
+                members = members.with_added(added[0])
+            elif added:
+                members = members.union(added)
+
+            for user_id in removed:
+                members = members.without(user_id)
+
+            self._set_members(members)
+        elif self._member_count is not None:
+            self._member_count += len(added) - len(removed)
+
+        if self.__team_guild is not None and (added or removed):
+            self.__team_guild._touch()
 
     async def add_member(
         self, user: discord.Object | discord.User | discord.Member
     ) -> None:
         """Add a user to the team members."""
-        await self.__database.add_member_to_team(self.id, user.id)
+        if await self.__database.add_member_to_team(self.id, user.id):
+            self._apply_members(added=(user.id,))
+
+    async def add_members(self, user_ids: Iterable[int]) -> set[int]:
+        """Add many users to the team, returning the ids that were inserted.
+
+        The users are written with a single statement, users that are already
+        members are skipped.
+        """
+        rows = [(self.id, user_id) for user_id in user_ids]
+        if not rows:
+            return set()
+
+        inserted, _ = await self.__database.apply_memberships(rows, [])
+        added = {user_id for _, user_id in inserted}
+        self._apply_members(added=added)
+
+        return added
 
     async def remove_member(
         self, user: discord.Object | discord.User | discord.Member
     ) -> None:
         """Remove a user from the team members."""
-        await self.__database.remove_member_from_team(self.id, user.id)
+        if await self.__database.remove_member_from_team(self.id, user.id):
+            self._apply_members(removed=(user.id,))
 
     async def edit(
         self,
@@ -87,16 +210,28 @@ class Team:
         lead_role: Optional[discord.Role] = None,
         member_role: Optional[discord.Role] = None,
     ) -> None:
-        """Edit the team's attributes and update database."""
+        """Edit the team's attributes and update database.
+
+        The edit is only applied if the team was not changed since it was
+        loaded. On a conflict the team is reloaded before
+        `errors.EditConflictError` is raised.
+        """
         lead_role_id = lead_role.id if lead_role is not None else None
         member_role_id = member_role.id if member_role is not None else None
 
-        data = await self.__database.update_team(
-            self.id,
-            name=name,
-            lead_role_id=lead_role_id,
-            member_role_id=member_role_id,
-        )
+        try:
+            data = await self.__database.update_team(
+                self.id,
+                name=name,
+                lead_role_id=lead_role_id,
+                member_role_id=member_role_id,
+                expected_version=self.version,
+            )
+        except errors.EditConflictError:
+            if self.__team_guild is not None:
+                await self.__team_guild.fetch_team(self.id)
+
+            raise
 
         self._update(data)
 
@@ -112,19 +247,225 @@ class Team:
         self.guild_id = data["guild_id"]
         self.lead_role_id = data["lead_role_id"]
         self.member_role_id = data["member_role_id"]
+        self.version = data["version"]
+
+        # Roles replaced by an edit are no longer missing
+        self.missing_role_ids &= {self.lead_role_id, self.member_role_id}
+
+        if self.__team_guild is not None:
+            self.__team_guild._index(self)
 
     async def delete(self) -> None:
         """Delete the team from the internal database."""
         await self.__database.delete_team(self.id)
 
+        if self.__team_guild is not None:
+            self.__team_guild._forget(self.id)
+
 
 class TeamGuild:
-    """A guild that contains teams."""
+    """A guild that contains teams.
+
+    Besides the team cache, the guild keeps an index from role ids to the ids
+    of the teams that role leads or is the member role of. The index is kept
+    current by team edits and gateway role events, which allows authorization
+    checks to be answered from memory.
+
+    `read_teams` serves the cache while it is younger than `freshness`
+    seconds. Past that the cache is still served while a single background
+    refresh brings it up to date.
+
+    Teams are never evicted from the cache, so every loaded team is a single
+    object that later loads update in place rather than duplicate.
+    """
 
     def __init__(self, database: Database, /, guild: discord.Guild) -> None:
         self.__database = database
         self.guild = guild
-        self.__cache: Cache[int, Team] = Cache()
+        # Unbounded, once complete every team of the guild must be present
+        self.__cache: dict[int, Team] = {}
+
+        self.__lead_index: dict[int, set[int]] = {}
+        self.__member_index: dict[int, set[int]] = {}
+        self.__indexed: dict[int, tuple[str, int, int]] = {}
+        self.__revision = 0
+        self.__complete = False
+
+        self.freshness = constants.Cache.team_freshness_overrides.get(
+            guild.id, constants.Cache.team_freshness
+        )
+        self.__fetched_at: Optional[float] = None
+        self.__refresh: Optional[asyncio.Task[list[Team]]] = None
+
+    @property
+    def revision(self) -> int:
+        """A counter that increases whenever team data in the guild changes.
+
+        Used by consumers to decide when derived data, such as rendered list
+        pages, must be rebuilt.
+        """
+        return self.__revision
+
+    def _touch(self) -> None:
+        """Mark the team data of the guild as changed."""
+        self.__revision += 1
+
+    def _index(self, team: Team) -> None:
+        """Index the roles of a team, replacing any previous entries.
+
+        Roles of the team that do not exist in the guild are flagged.
+        """
+        roles = (team.lead_role_id, team.member_role_id)
+        if not self.guild.unavailable:
+            team.missing_role_ids = frozenset(
+                role_id
+                for role_id in roles
+                if self.guild.get_role(role_id) is None
+            )
+
+        state = (team.name, *roles)
+        if self.__indexed.get(team.id) == state:
+            return
+
+        self._unindex(team.id)
+        self._touch()
+
+        self.__indexed[team.id] = state
+        self.__lead_index.setdefault(team.lead_role_id, set()).add(team.id)
+        self.__member_index.setdefault(team.member_role_id, set()).add(team.id)
+
+    def _unindex(self, team_id: int) -> None:
+        """Remove the roles of a team from the index."""
+        state = self.__indexed.pop(team_id, None)
+        if state is None:
+            return
+
+        _, lead_role_id, member_role_id = state
+        for index, role_id in (
+            (self.__lead_index, lead_role_id),
+            (self.__member_index, member_role_id),
+        ):
+            team_ids = index.get(role_id)
+            if team_ids is None:
+                continue
+
+            team_ids.discard(team_id)
+            if not team_ids:
+                del index[role_id]
+
+    def _forget(self, team_id: int) -> None:
+        """Remove a team from the cache and the index."""
+        if (team := self.__cache.pop(team_id, None)) is not None:
+            team.deleted = True
+
+        if team is not None or team_id in self.__indexed:
+            self._touch()
+
+        self._unindex(team_id)
+
+    def discard_role(self, role_id: int) -> list[Team]:
+        """Remove a role that no longer exists from the index.
+
+        The cached teams that use the role are flagged and returned.
+        """
+        team_ids = self.__lead_index.pop(role_id, set())
+        team_ids |= self.__member_index.pop(role_id, set())
+
+        teams = []
+        for team_id in team_ids:
+            if (team := self.__cache.get(team_id)) is not None:
+                team.missing_role_ids |= {role_id}
+                teams.append(team)
+
+        if team_ids:
+            self._touch()
+
+        return teams
+
+    def uses_role(self, role_id: int) -> bool:
+        """Check if an indexed team uses the role."""
+        return role_id in self.__lead_index or role_id in self.__member_index
+
+    def invalidate(self) -> None:
+        """Mark the cached teams as stale.
+
+        The cache keeps being served and the next read revalidates it in the
+        background.
+        """
+        self.__fetched_at = None
+
+    def led_team_ids(self, member: discord.Member) -> set[int]:
+        """Return the ids of the indexed teams the member leads."""
+        team_ids: set[int] = set()
+        for role in member.roles:
+            team_ids.update(self.__lead_index.get(role.id, ()))
+
+        return team_ids
+
+    def member_team_ids(self, member: discord.Member) -> set[int]:
+        """Return the ids of the indexed teams whose member role is held."""
+        team_ids: set[int] = set()
+        for role in member.roles:
+            team_ids.update(self.__member_index.get(role.id, ()))
+
+        return team_ids
+
+    def can_manage(self, member: discord.Member, team: Team) -> bool:
+        """Check if the member holds the lead role of the team."""
+        return any(
+            team.id in self.__lead_index.get(role.id, ())
+            for role in member.roles
+        )
+
+    async def change_memberships(
+        self,
+        member: discord.Member,
+        *,
+        add: Iterable[Team] = (),
+        remove: Iterable[Team] = (),
+        reason: Optional[str] = None,
+    ) -> None:
+        """Add a member to and remove them from several teams at once.
+
+        The memberships change in a single database transaction, and the
+        member roles of the teams change with a single role edit applying the
+        net difference, so the member is never left between teams.
+        """
+        add, remove = list(add), list(remove)
+        if {team.id for team in add} & {team.id for team in remove}:
+            raise ValueError("a team can not be both added and removed")
+
+        inserted, deleted = await self.__database.apply_memberships(
+            [(team.id, member.id) for team in add],
+            [(team.id, member.id) for team in remove],
+        )
+
+        for team in add:
+            if (team.id, member.id) in inserted:
+                team._apply_members(added=(member.id,))
+        for team in remove:
+            if (team.id, member.id) in deleted:
+                team._apply_members(removed=(member.id,))
+
+        current = {role.id for role in member.roles if not role.is_default()}
+        roles = current - {team.member_role_id for team in remove}
+        roles |= {team.member_role_id for team in add}
+
+        if roles != current:
+            await member.edit(
+                roles=[discord.Object(id) for id in roles], reason=reason
+            )
+
+    async def move_member(
+        self, member: discord.Member, source: Team, target: Team
+    ) -> None:
+        """Move a member from one team to another."""
+        await self.change_memberships(
+            member,
+            add=(target,),
+            remove=(source,),
+            reason=f"move from {source.name} to {target.name}",
+        )
 
     async def create_team(
         self, name: str, lead_role: discord.Role, member_role: discord.Role
@@ -134,8 +475,8 @@ class TeamGuild:
             self.guild.id, name, lead_role.id, member_role.id
         )
 
-        team = Team(self.__database, data=data)
-        self.__cache.put(team.id, team)
+        team = self._store(data)
+        team._member_count = 0
 
         return team
 
@@ -144,24 +485,236 @@ class TeamGuild:
         return self.__cache.get(id)
 
     async def fetch_team(self, id: int) -> Optional[Team]:
-        """Fetch the team with the provided id."""
-        data = await self.__database.fetch_team(id)
+        """Fetch the team with the provided id.
+
+        Falls back to the cached team if the database is unavailable.
+        """
+        try:
+            data = await self.__database.fetch_team(id)
+        except errors.DatabaseUnavailableError:
+            if (team := self.get_team(id)) is not None or self.__complete:
+                return team
+
+            raise
         if data is None:
+            # The cached team is kept if its removal can not be confirmed
+            with suppress(errors.DatabaseUnavailableError):
+                await self._forget_missing((id,))
+
+            return self.get_team(id)
+
+        if data["guild_id"] != self.guild.id:
+            self._forget(id)
             return None
 
-        team = Team(self.__database, data=data)
-        self.__cache.put(team.id, team)
-        return team
+        return self._store(data)
+
+    @property
+    def fresh(self) -> bool:
+        """A bool indicating if the cached teams are within `freshness`."""
+        return (
+            self.__complete
+            and self.__fetched_at is not None
+            and time.monotonic() - self.__fetched_at <= self.freshness
+        )
+
+    async def read_teams(self) -> list[Team]:
+        """Return all the teams in the guild, preferring the cache.
+
+        Fresh cached teams are returned immediately. Stale cached teams are
+        returned as well, and a background refresh is started. The database is
+        only waited on if the cache does not hold every team of the guild.
+        """
+        if not self.__complete:
+            return await self.fetch_teams()
+
+        if not self.fresh:
+            self.__start_refresh()
+
+        return self.cached_teams()
+
+    def __start_refresh(self) -> "asyncio.Task[list[Team]]":
+        """Start a refresh of the teams unless one is already running."""
+        if self.__refresh is not None and not self.__refresh.done():
+            return self.__refresh
+
+        def done(task: "asyncio.Task[list[Team]]") -> None:
+            if not task.cancelled() and (error := task.exception()):
+                logger.warning(
+                    "team refresh failed for guild %d",
+                    self.guild.id,
+                    exc_info=error,
+                )
+
+        self.__refresh = asyncio.create_task(self.__fetch_teams())
+        self.__refresh.add_done_callback(done)
+
+        return self.__refresh
 
     async def fetch_teams(self) -> list[Team]:
-        """Fetch all the teams in the guild."""
-        entries = await self.__database.fetch_teams_from_guild(self.guild.id)
+        """Fetch all the teams in the guild.
 
-        teams = []
+        Concurrent fetches share a single query. Falls back to the cached teams
+        if the database is unavailable and the cache holds every team of the
+        guild.
+        """
+        return await asyncio.shield(self.__start_refresh())
+
+    async def __fetch_teams(self) -> list[Team]:
+        """Query the teams of the guild and replace the cached teams.
+
+        Once every team is cached, only the team versions are queried and just
+        the teams whose version changed are fetched again.
+        """
+        try:
+            if self.__complete:
+                teams = await self.__revalidate()
+            else:
+                entries = await self.__database.fetch_teams_from_guild(
+                    self.guild.id
+                )
+                teams = self._replace(entries)
+                await self._forget_missing(
+                    self.__cache.keys() - {team.id for team in teams}
+                )
+        except errors.DatabaseUnavailableError:
+            if not self.__complete:
+                raise
+
+            logger.info("serving cached teams for guild %d", self.guild.id)
+            return self.cached_teams()
+
+        self.__fetched_at = time.monotonic()
+
+        return teams
+
+    async def __revalidate(self) -> list[Team]:
+        """Bring the cached teams up to date with their database versions."""
+        versions = await self.__database.fetch_team_versions(self.guild.id)
+
+        cached = {team.id: team.version for team in self.cached_teams()}
+        changed = [
+            team_id
+            for team_id, version in versions.items()
+            if cached.get(team_id) != version
+        ]
+
+        if changed:
+            for data in await self.__database.fetch_teams(changed):
+                self._store(data)
+
+        await self._forget_missing(cached.keys() - versions.keys())
 
-        for data in entries:
-            team = Team(self.__database, data=data)
-            self.__cache.put(team.id, team)
-            teams.append(team)
+        return self.cached_teams()
 
+    async def _forget_missing(self, team_ids: Iterable[int]) -> None:
+        """Forget the cached teams that a read did not return.
+
+        Reads may come from a replica that lags behind, so only the teams the
+        primary confirms to be gone are forgotten.
+        """
+        team_ids = [id for id in team_ids if id in self.__cache]
+        if not team_ids:
+            return
+
+        existing = await self.__database.fetch_existing_team_ids(team_ids)
+        for team_id in team_ids:
+            if team_id not in existing:
+                self._forget(team_id)
+
+    def cached_teams(self) -> list[Team]:
+        """Return the teams stored in the internal cache."""
+        return list(self.__cache.values())
+
+    def _store(self, data: "TeamData") -> Team:
+        """Cache the team data, updating the live team in place if present."""
+        team = self.__cache.get(data["id"])
+        if team is None:
+            team = Team(self.__database, data=data, team_guild=self)
+            self.__cache[team.id] = team
+        elif data["version"] >= team.version:
+            # Older data, such as a snapshot, never rolls back a live team
+            team._update(data)
+
+        return team
+
+    def _replace(self, entries: Iterable["TeamData"]) -> list[Team]:
+        """Cache the full set of teams in the guild.
+
+        Cached teams missing from the entries are kept, callers pass them to
+        `_forget_missing`.
+        """
+        teams = [self._store(data) for data in entries]
+
+        self.__complete = True
         return teams
+
+    def _populate(
+        self,
+        entries: Iterable[tuple["TeamData", Optional[int]]],
+        *,
+        fresh: bool = True,
+    ) -> None:
+        """Prefill the cache with teams and their member counts.
+
+        Entries that did not just come from the database, such as a snapshot,
+        should not be marked as fresh so the next read revalidates them.
+        """
+        entries = list(entries)
+        teams = self._replace(data for data, _ in entries)
+
+        for team, (_, count) in zip(teams, entries, strict=True):
+            team._member_count = count
+
+        self.__fetched_at = time.monotonic() if fresh else None
+
+    def _export(self) -> Optional[list[tuple["TeamData", Optional[int]]]]:
+        """Return the cached teams and member counts for a snapshot.
+
+        Returns None if the cache does not hold every team of the guild.
+        """
+        if not self.__complete:
+            return None
+
+        return [
+            (
+                {
+                    "id": team.id,
+                    "name": team.name,
+                    "guild_id": team.guild_id,
+                    "lead_role_id": team.lead_role_id,
+                    "member_role_id": team.member_role_id,
+                    "version": team.version,
+                },
+                team._member_count,
+            )
+            for team in self.cached_teams()
+        ]
+
+    async def export_roster(
+        self, output: IO[bytes], /, teams: Optional[Iterable[Team]] = None
+    ) -> None:
+        """Write the roster of the guild, or of the given teams, as csv."""
+        team_ids = [team.id for team in teams] if teams is not None else None
+
+        await self.__database.copy_roster(self.guild.id, output, team_ids)
+
+    async def import_members(
+        self, records: Iterable[tuple[Team, int]]
+    ) -> set[tuple[int, int]]:
+        """Add many users to teams, returning the (team, user) ids inserted."""
+        rows = [(team.id, user_id) for team, user_id in records]
+        if not rows:
+            return set()
+
+        inserted = await self.__database.import_members(rows)
+
+        added: dict[int, list[int]] = {}
+        for team_id, user_id in inserted:
+            added.setdefault(team_id, []).append(user_id)
+
+        for team_id, user_ids in added.items():
+            if (team := self.get_team(team_id)) is not None:
+                team._apply_members(added=user_ids)
+
+        return inserted
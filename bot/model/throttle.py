@@ -0,0 +1,99 @@
+import time
+from collections.abc import Mapping
+from typing import Optional
+
+from bot.model.cache import Cache
+
+# Tokens refilled per second and the most tokens a bucket holds
+Rate = tuple[float, int]
+
+
+class TokenBucket:
+    """A token bucket that refills continuously up to its capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def delay(self, cost: float = 1) -> float:
+        """Return the seconds until `cost` tokens are available."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+        if self.tokens >= cost:
+            return 0.0
+
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float = 1) -> None:
+        """Remove tokens, `delay` must have returned 0 for the cost."""
+        self.tokens -= cost
+
+
+class Throttle:
+    """Token buckets per guild and per user for each cost class.
+
+    Every cost class is limited by a bucket per guild, so a single busy guild
+    can not take up the capacity shared by every guild, and by a bucket per
+    user. A request is only admitted if both of its buckets have a token.
+    Buckets of idle keys are evicted, which only ever makes the limiter more
+    lenient.
+    """
+
+    def __init__(
+        self,
+        *,
+        guild: Mapping[str, Rate],
+        user: Mapping[str, Rate],
+        limit: int = 1024,
+    ) -> None:
+        self.guild_rates = guild
+        self.user_rates = user
+
+        self.__buckets: Cache[tuple[str, str, int], TokenBucket] = Cache(
+            limit=limit
+        )
+
+    def __bucket(
+        self, rates: Mapping[str, Rate], scope: str, name: str, key: int
+    ) -> Optional[TokenBucket]:
+        """Return the bucket of a key, creating it if the class is limited."""
+        if (rate := rates.get(name)) is None:
+            return None
+
+        bucket = self.__buckets.get((scope, name, key))
+        if bucket is None:
+            bucket = TokenBucket(*rate)
+            self.__buckets.put((scope, name, key), bucket)
+
+        return bucket
+
+    def acquire(
+        self, name: str, *, guild_id: Optional[int], user_id: int
+    ) -> float:
+        """Take a token of the cost class for the guild and the user.
+
+        Returns 0 if the request is admitted, otherwise the seconds to wait
+        before it would be. Rejected requests take no tokens.
+        """
+        buckets = [self.__bucket(self.user_rates, "user", name, user_id)]
+        if guild_id is not None:
+            buckets.append(
+                self.__bucket(self.guild_rates, "guild", name, guild_id)
+            )
+
+        limited = [bucket for bucket in buckets if bucket is not None]
+        if wait := max((bucket.delay() for bucket in limited), default=0.0):
+            return wait
+
+        for bucket in limited:
+            bucket.take()
+
+        return 0.0
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Any, Optional, TYPE_CHECKING
 
@@ -5,7 +6,7 @@ import discord
 from discord import app_commands
 from discord.app_commands import AppCommandError, CommandTree
 
-from bot import errors
+from bot import constants, errors
 
 if TYPE_CHECKING:
     from discord.abc import Snowflake
@@ -15,12 +16,19 @@ if TYPE_CHECKING:
 
 _log = logging.getLogger(__name__)
 
+_AUTO_DEFER = "auto_defer"
+
 
 class PhoenixTree(CommandTree):
     """The custom class for the command tree with the client."""
 
     async def interaction_check(self, interaction: "Interaction") -> bool:
-        """Return true after logging the interaction being used."""
+        """Return true after logging the interaction being used.
+
+        Application commands are armed to be deferred automatically if they
+        have not responded shortly before discord's response deadline, unless
+        the command's extras set `auto_defer` to False.
+        """
         if (command := interaction.command) is not None:
             _log.debug(
                 "interaction issued; by: %s, %d",
@@ -28,17 +36,88 @@ class PhoenixTree(CommandTree):
                 interaction.user.id,
             )
 
+        if interaction.type is discord.InteractionType.application_command and (
+            command is None or command.extras.get("auto_defer", True)
+        ):
+            self.__arm_auto_defer(interaction)
+
         return True
 
+    def __arm_auto_defer(self, interaction: "Interaction") -> None:
+        """Schedule a defer of the interaction before its deadline.
+
+        The defer uses the `ephemeral` entry of the command's extras so a
+        later followup keeps the visibility the command intended.
+        """
+        command = interaction.command
+        ephemeral = (
+            bool(command.extras.get("ephemeral", False))
+            if command is not None
+            else False
+        )
+
+        elapsed = (
+            discord.utils.utcnow() - interaction.created_at
+        ).total_seconds()
+        delay = max(0.0, constants.Interactions.auto_defer_after - elapsed)
+
+        async def defer() -> None:
+            if interaction.response.is_done():
+                return
+
+            try:
+                await interaction.response.defer(ephemeral=ephemeral)
+            except (discord.InteractionResponded, discord.HTTPException):
+                return
+
+            _log.info(
+                "auto deferred %s",
+                command.qualified_name
+                if command is not None
+                else "interaction",
+            )
+
+        def fire() -> None:
+            interaction.extras[_AUTO_DEFER] = asyncio.create_task(defer())
+
+        loop = asyncio.get_running_loop()
+        interaction.extras[_AUTO_DEFER] = loop.call_later(delay, fire)
+
+    async def __settle_auto_defer(self, interaction: "Interaction") -> None:
+        """Cancel a pending auto defer or wait for one in flight."""
+        pending = interaction.extras.pop(_AUTO_DEFER, None)
+
+        if isinstance(pending, asyncio.TimerHandle):
+            pending.cancel()
+        elif isinstance(pending, asyncio.Task):
+            await pending
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
         self.__commands_cache: dict = {}
 
+    async def defer(self, interaction: "Interaction", **kwargs: Any) -> None:
+        """Defer the interaction unless it was already responded to.
+
+        Commands use this instead of `interaction.response.defer` as the
+        interaction may have been deferred automatically.
+        """
+        await self.__settle_auto_defer(interaction)
+
+        if not interaction.response.is_done():
+            await interaction.response.defer(**kwargs)
+
     async def respond(
         self, interaction: "Interaction", *args: Any, **kwargs: Any
     ) -> None:
-        """Either respond or send a followup on an interaction response."""
+        """Either respond or send a followup on an interaction response.
+
+        Transparently switches to a followup if the interaction was deferred,
+        including automatic defers.
+        """
+        await self.__settle_auto_defer(interaction)
+
         if interaction.response.is_done():
             await interaction.followup.send(*args, **kwargs)
 
@@ -83,6 +162,17 @@ class PhoenixTree(CommandTree):
         Known internal errors are propogated to the user. Cases where code has
         failed, report the error to the user and alert devs.
         """
+        # Errors raised by callbacks and transformers arrive wrapped
+        original = getattr(error, "original", None) or error.__cause__
+        if isinstance(
+            original,
+            (errors.DatabaseUnavailableError, errors.EditConflictError),
+        ):
+            embed = original.format_notif_embed(interaction)
+            await self.respond(interaction, embed=embed, ephemeral=True)
+
+            return
+
         if isinstance(error, app_commands.CommandInvokeError):
             embed = errors.InternalError().format_notif_embed(interaction)
             await self.respond(interaction, embed=embed, ephemeral=True)
@@ -113,4 +203,5 @@ class PhoenixTree(CommandTree):
     async def alert(
         self, interaction: "Interaction", error: AppCommandError
     ) -> None:
-        """TODO."""
+        """Report the error to the devs through the client's alert digest."""
+        await interaction.client.alert(interaction, error)
@@ -1,7 +1,26 @@
-from .helper import get_or_fetch_channel, get_or_fetch_message, is_bot_admin
+from .heap import HeapTracker, object_counts
+from .helper import (
+    bounded_gather,
+    get_or_fetch_channel,
+    get_or_fetch_member,
+    get_or_fetch_message,
+    is_bot_admin,
+    resident_memory,
+)
+from .profiler import Profile, StackSampler
+from .transformers import MemoTransformer, resolution_cache
 
 __all__ = (
     "is_bot_admin",
     "get_or_fetch_channel",
+    "get_or_fetch_member",
     "get_or_fetch_message",
+    "bounded_gather",
+    "resident_memory",
+    "MemoTransformer",
+    "resolution_cache",
+    "Profile",
+    "StackSampler",
+    "HeapTracker",
+    "object_counts",
 )
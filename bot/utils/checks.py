@@ -21,7 +21,7 @@ from discord.ext.commands import (
 )
 from discord.interactions import Interaction
 
-from bot.errors import InvalidAuthorizationError
+from bot.errors import InvalidAuthorizationError, RateLimitedError
 
 if TYPE_CHECKING:
     from bot.client import Phoenix
@@ -73,3 +73,26 @@ def block() -> Any:
         raise InvalidAuthorizationError
 
     return combined_check(predicate)
+
+
+def throttled(cost: str) -> Any:
+    """Limit how often the command is used per guild and per user.
+
+    `cost` names the cost class of the command, see `constants.Throttle`.
+    """
+
+    def predicate(info: "Info") -> bool:
+        if isinstance(info, Interaction):
+            user, client = info.user, info.client
+        else:
+            user, client = info.author, info.bot
+
+        guild_id = info.guild.id if info.guild is not None else None
+        if retry_after := client.throttle.acquire(
+            cost, guild_id=guild_id, user_id=user.id
+        ):
+            raise RateLimitedError(retry_after)
+
+        return True
+
+    return combined_check(predicate)
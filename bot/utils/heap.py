@@ -0,0 +1,145 @@
+import gc
+import sys
+import tracemalloc
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+
+__all__ = ("HeapTracker", "object_counts")
+
+# Allocations made by the tracing machinery itself are not of interest
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _module_name(filename: str) -> str:
+    """Return the dotted module name of a source file if it is importable."""
+    path = Path(filename)
+    for entry in sorted(filter(None, sys.path), key=len, reverse=True):
+        try:
+            relative = path.relative_to(entry)
+        except ValueError:
+            continue
+
+        parts = relative.with_suffix("").parts
+        if parts and parts[-1] == "__init__":
+            parts = parts[:-1]
+
+        return ".".join(parts) or filename
+
+    return filename
+
+
+def object_counts(types: Iterable[type]) -> dict[str, int]:
+    """Count the live objects tracked by the garbage collector per type.
+
+    Instances of subclasses are counted towards every provided base.
+    """
+    types = tuple(types)
+    counts = {t.__qualname__: 0 for t in types}
+
+    for obj in gc.get_objects():
+        for t in types:
+            if isinstance(obj, t):
+                counts[t.__qualname__] += 1
+
+    return counts
+
+
+class HeapTracker:
+    """Snapshots of the Python heap taken with `tracemalloc`.
+
+    Tracing only covers allocations made after `start`, and slows allocations
+    down while enabled, so it should be stopped once done.
+    """
+
+    def __init__(self) -> None:
+        self.__baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        """A bool indicating if allocations are currently traced."""
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        """Start tracing allocations, keeping `frames` frames per trace."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+        self.__baseline = None
+
+    def stop(self) -> None:
+        """Stop tracing and release the traces and the baseline."""
+        tracemalloc.stop()
+        self.__baseline = None
+
+    def snapshot(self, limit: int = 25) -> str:
+        """Take a snapshot as the new baseline and report the largest modules.
+
+        Raises RuntimeError if allocations are not being traced.
+        """
+        snapshot = self.__take()
+        self.__baseline = snapshot
+
+        lines = ["Largest allocations by module", ""]
+        for module, size, count in self.__by_module(
+            (s.traceback[0].filename, s.size, s.count)
+            for s in snapshot.statistics("filename")
+        )[:limit]:
+            lines.append(f"{size / 1024:>12.1f} KiB {count:>9} {module}")
+
+        return "\n".join(lines)
+
+    def diff(self, limit: int = 25) -> str:
+        """Compare a new snapshot with the baseline and report the growth.
+
+        The new snapshot replaces the baseline, so consecutive diffs each cover
+        the time since the previous one. Raises RuntimeError if allocations are
+        not being traced or no baseline was taken.
+        """
+        if self.__baseline is None:
+            raise RuntimeError("no baseline snapshot")
+
+        snapshot = self.__take()
+        stats = snapshot.compare_to(self.__baseline, "filename")
+        self.__baseline = snapshot
+
+        grown = self.__by_module(
+            (s.traceback[0].filename, s.size_diff, s.count_diff) for s in stats
+        )
+        lines = ["Allocation growth by module since the baseline", ""]
+        for module, size, count in grown[:limit]:
+            lines.append(f"{size / 1024:>+12.1f} KiB {count:>+9} {module}")
+
+        return "\n".join(lines)
+
+    def __take(self) -> tracemalloc.Snapshot:
+        """Take a snapshot without the allocations of the tracing itself."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("allocations are not being traced")
+
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    @staticmethod
+    def __by_module(
+        stats: Iterable[tuple[str, int, int]],
+    ) -> list[tuple[str, int, int]]:
+        """Sum statistics per module, largest first."""
+        modules: dict[str, list[int]] = {}
+        for filename, size, count in stats:
+            totals = modules.setdefault(_module_name(filename), [0, 0])
+            totals[0] += size
+            totals[1] += count
+
+        return sorted(
+            (
+                (module, size, count)
+                for module, (size, count) in modules.items()
+            ),
+            key=lambda entry: abs(entry[1]),
+            reverse=True,
+        )
@@ -1,4 +1,8 @@
-from typing import Optional, TYPE_CHECKING, Union
+import asyncio
+import resource
+import sys
+from collections.abc import Awaitable, Iterable
+from typing import Optional, TYPE_CHECKING, TypeVar, Union
 
 import discord
 from discord import Message, PartialMessageable
@@ -10,6 +14,8 @@ if TYPE_CHECKING:
 
     Channel = Union[GuildChannel, PrivateChannel, Thread]
 
+T = TypeVar("T")
+
 
 def is_bot_admin(user: discord.User | discord.Member) -> bool:
     """Check if the user is a bot admin."""
@@ -30,6 +36,35 @@ async def get_or_fetch_channel(
     return channel
 
 
+async def get_or_fetch_member(
+    guild: discord.Guild, member_id: int
+) -> discord.Member:
+    """Search for the member in the cache, otherwise fetch."""
+    member = guild.get_member(member_id)
+
+    if member is None:
+        member = await guild.fetch_member(member_id)
+
+    return member
+
+
+def resident_memory() -> int:
+    """Return the resident memory of the process in bytes.
+
+    Falls back to the peak resident memory where the current value is not
+    available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in kilobytes on linux and in bytes on macos
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    return pages * resource.getpagesize()
+
+
 async def get_or_fetch_message(
     channel: PartialMessageable, message_id: int
 ) -> Optional[Message]:
@@ -38,3 +73,22 @@ async def get_or_fetch_message(
         return await channel.fetch_message(message_id)
     except (discord.NotFound, discord.Forbidden, discord.HTTPException):
         return None
+
+
+async def bounded_gather(
+    aws: Iterable[Awaitable[T]], /, limit: int
+) -> list[T | BaseException]:
+    """Await the awaitables with at most `limit` of them running at once.
+
+    Results are returned in order. Exceptions are returned in place of the
+    result instead of being raised so one failure does not abort the rest.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(run(aw) for aw in aws), return_exceptions=True
+    )
@@ -0,0 +1,167 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Optional
+
+__all__ = ("Profile", "StackSampler")
+
+# The root frame of the stacks of suspended coroutines
+AWAITING = "[awaiting]"
+
+
+def _label(code: CodeType) -> str:
+    """Return the flamegraph label of a code object."""
+    filename = Path(code.co_filename).name
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def _frame_stack(frame: Optional[FrameType]) -> list[str]:
+    """Return the labels of a thread stack, outermost frame first."""
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro: Any) -> Iterator[CodeType]:
+    """Yield the code of a suspended coroutine and everything it awaits."""
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(
+            coro, "gi_frame", None
+        )
+        if frame is None:
+            return
+
+        yield frame.f_code
+        coro = getattr(coro, "cr_await", None) or getattr(
+            coro, "gi_yieldfrom", None
+        )
+
+
+class Profile:
+    """The stacks collected by a `StackSampler`."""
+
+    def __init__(self, stacks: Counter[str], samples: int, duration: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+
+    def collapsed(self) -> str:
+        """Return the stacks in the collapsed format read by flamegraph tools.
+
+        Every line holds the frames of a stack separated by `;`, outermost
+        first, followed by the number of samples it was seen in.
+        """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def top(self, n: int = 10) -> list[tuple[str, int, int]]:
+        """Return the hottest functions with their self and total samples.
+
+        Self samples count the function at the top of a stack, total samples
+        count every stack the function appears in at all. Only running stacks
+        are considered, suspended coroutines do not use the CPU.
+        """
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            if frames[0] == AWAITING:
+                continue
+
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        return [
+            (frame, count, total[frame]) for frame, count in own.most_common(n)
+        ]
+
+
+class StackSampler:
+    """A sampling profiler that inspects the process from a separate thread.
+
+    The stack of every thread is recorded at a fixed interval. The thread of
+    the event loop is recorded under `[loop]`, and the suspended coroutines of
+    its other tasks are recorded under `[awaiting]`, so both the code that is
+    running and the code that is waiting show up. The loop is never paused.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, *, interval: float = 0.005
+    ) -> None:
+        self.loop = loop
+        self.interval = interval
+
+        self.__loop_thread = threading.get_ident()
+
+    async def profile(self, seconds: float) -> Profile:
+        """Sample the process for the provided number of seconds."""
+        return await asyncio.to_thread(
+            self.__run, seconds, asyncio.current_task()
+        )
+
+    def __run(
+        self, seconds: float, caller: Optional["asyncio.Task[Any]"]
+    ) -> Profile:
+        """Collect samples until the time runs out."""
+        own_thread = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        samples = 0
+
+        start = time.perf_counter()
+        deadline = start + seconds
+        while (now := time.perf_counter()) < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own_thread:
+                    continue
+
+                if ident == self.__loop_thread:
+                    root = "[loop]"
+                else:
+                    root = f"[thread {names.get(ident, ident)}]"
+
+                stacks[";".join([root, *_frame_stack(frame)])] += 1
+
+            for stack in self.__task_stacks(caller):
+                stacks[stack] += 1
+
+            samples += 1
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+
+        return Profile(stacks, samples, time.perf_counter() - start)
+
+    def __task_stacks(
+        self, caller: Optional["asyncio.Task[Any]"]
+    ) -> Iterator[str]:
+        """Yield the stacks of the tasks suspended on the event loop.
+
+        The task running the profile is skipped, as is a task that is running
+        at the moment since its frames are part of the loop thread stack.
+        """
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+        except RuntimeError:
+            # The task set changed while it was copied, skip this sample
+            return
+
+        for task in tasks:
+            coro = task.get_coro()
+            if task is caller or getattr(coro, "cr_running", False):
+                continue
+
+            codes = list(_await_chain(coro))
+            if codes:
+                yield ";".join([AWAITING, *map(_label, codes)])
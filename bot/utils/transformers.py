@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+from collections.abc import Hashable
+from typing import Any, TYPE_CHECKING
+
+from discord import app_commands
+
+if TYPE_CHECKING:
+    from bot.utils.types import Interaction
+
+__all__ = ("MemoTransformer", "resolution_cache")
+
+_RESOLVED_KEY = "resolved"
+
+
+def resolution_cache(interaction: "Interaction") -> dict[Hashable, Any]:
+    """Return the per-interaction cache of resolved parameter values.
+
+    The cache lives in `interaction.extras` and is discarded together with the
+    interaction.
+    """
+    return interaction.extras.setdefault(_RESOLVED_KEY, {})  # type: ignore[no-any-return]
+
+
+class MemoTransformer(app_commands.Transformer, ABC):
+    """A transformer that resolves each value at most once per interaction.
+
+    Checks that need the resolved value of a parameter and the command
+    invocation itself share the same result. Subclasses implement `resolve`
+    instead of `transform`.
+    """
+
+    async def transform(self, interaction: "Interaction", value: Any) -> Any:
+        """Return the memoized resolution of the value or resolve it."""
+        cache = resolution_cache(interaction)
+        key = (self.__class__, value)
+
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        result = await self.resolve(interaction, value)
+        cache[key] = result
+
+        return result
+
+    @abstractmethod
+    async def resolve(self, interaction: "Interaction", value: Any) -> Any:
+        """Resolve the value into the transformed object."""
@@ -1,4 +1,5 @@
-from typing import TYPE_CHECKING, TypedDict
+from datetime import datetime
+from typing import Any, Optional, TYPE_CHECKING, TypedDict
 
 from discord.ext.commands import Context as _Context
 from discord.interactions import Interaction as _Interaction
@@ -9,7 +10,7 @@ if TYPE_CHECKING:
     Interaction = _Interaction[Phoenix]
     Context = _Context[Phoenix]
 
-__all__ = ("Context", "Interaction", "TeamData")
+__all__ = ("Context", "Interaction", "JobData", "TeamData", "TeamSummaryData")
 
 
 class TeamData(TypedDict):
@@ -20,3 +21,28 @@ class TeamData(TypedDict):
     id: int
     lead_role_id: int
     member_role_id: int
+    version: int
+
+
+class TeamSummaryData(TeamData):
+    """A team stored in the database along with its member count."""
+
+    member_count: int
+
+
+class JobData(TypedDict):
+    """A representation of a background job stored in the database."""
+
+    id: int
+    kind: str
+    guild_id: int
+    payload: dict[str, Any]
+    checkpoint: Optional[dict[str, Any]]
+    priority: int
+    status: str
+    progress: int
+    total: Optional[int]
+    error: Optional[str]
+    created_by: Optional[int]
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,12 @@
+ALTER TABLE team ADD COLUMN version BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION team_bump_version() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER team_version
+    BEFORE UPDATE ON team
+    FOR EACH ROW EXECUTE FUNCTION team_bump_version();
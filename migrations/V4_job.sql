@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER NOT NULL GENERATED BY DEFAULT AS IDENTITY,
+    kind VARCHAR(50) NOT NULL,
+    guild_id BIGINT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    checkpoint JSONB,
+    priority SMALLINT NOT NULL DEFAULT 0,
+    status VARCHAR(10) NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    created_by BIGINT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    CHECK (status IN ('queued', 'running', 'done', 'failed', 'cancelled')),
+    PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS job_queue
+    ON job (priority DESC, id)
+    WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS job_guild ON job (guild_id, id DESC);
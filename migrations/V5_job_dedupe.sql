@@ -0,0 +1,3 @@
+CREATE UNIQUE INDEX IF NOT EXISTS job_active
+    ON job (kind, guild_id, payload)
+    WHERE status IN ('queued', 'running');
@@ -10,6 +10,11 @@ from dotenv import load_dotenv
 _log = getLogger(__name__)
 
 
+def migration_version(file: Path) -> int:
+    """Return the version of a migration file, such as 3 for V3_name.sql."""
+    return int(file.name[1:].split("_", 1)[0])
+
+
 class Migrator:
     """Handle the migrations between database changes."""
 
@@ -68,7 +73,11 @@ class Migrator:
         return [r["file_name"] for r in results]
 
     async def do_migration(self, file: Path) -> None:
-        """Do the migration for a file."""
+        """Do the migration for a file.
+
+        The migration is recorded in the same transaction, so a failed
+        migration is never marked as done.
+        """
         try:
             conn = await self.__get_connection()
             async with conn.transaction():
@@ -77,21 +86,20 @@ class Migrator:
                     _log.debug("%s: %s", file, script)
 
                     await conn.execute(script)
+
+                await conn.execute(
+                    """
+                    INSERT INTO __arc_migrations.__migrations
+                    (file_name)
+                    VALUES ($1)
+                    """,
+                    file.name,
+                )
         except Exception:
             # Migration failed and program will error where database required
             # therefore execution should be aborted
             _log.exception("Migration failed for %s", file)
             exit(1)
-        finally:
-            migrator = await self.__get_connection()
-            await migrator.execute(
-                """
-                INSERT INTO __arc_migrations.__migrations
-                (file_name)
-                VALUES ($1)
-                """,
-                file.name,
-            )
 
 
 async def main() -> None:
@@ -107,7 +115,8 @@ async def main() -> None:
     migration_scripts = Path("migrations")
     migrations = await migrator.fetch_migrations()
 
-    for file in migration_scripts.iterdir():
+    # Later migrations depend on earlier ones, iterdir order is arbitrary
+    for file in sorted(migration_scripts.iterdir(), key=migration_version):
         if file.name not in migrations:
             _log.debug("proceeding with migration %s", file)
             await migrator.do_migration(file)